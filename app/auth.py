@@ -1,10 +1,14 @@
-import os, datetime
+import os, datetime, hashlib, time
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status, Cookie, Header
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from db import get_async_db
 from models import User
+from schemas import UserOut
+from services import metrics
+from services.cache import TTLCache
 
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
 ALGO = "HS256"
@@ -23,6 +27,31 @@ def verify_password(password: str, hashed: str) -> bool:
     # Verifica contra el esquema usado en el hash almacenado (auto-detecta)
     return pwd.verify(password, hashed)
 
+# Claims verificados por token (hash del token completo) y usuarios (forma UserOut) por id:
+# en estado estable get_current_user no toca la base de datos.
+claims_cache = TTLCache(settings.AUTH_CACHE_MAX, settings.AUTH_CACHE_TTL_S)
+user_cache = TTLCache(settings.AUTH_CACHE_MAX, settings.AUTH_CACHE_TTL_S)
+
+def _token_key(token: str) -> str:
+    # el token entero: con solo la firma, un header/payload alterado con una
+    # firma válida reutilizada recibiría los claims cacheados sin verificarse
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def invalidate_token(token: str | None) -> None:
+    if token:
+        claims_cache.pop(_token_key(token))
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.pop(user_id)
+
+_caches = (("claims", claims_cache), ("user", user_cache))
+metrics.CallbackGauge("auth_cache_hits_total", "Aciertos del cache de autenticación",
+                      lambda: [((n,), c.hits) for n, c in _caches], ("cache",), type_="counter")
+metrics.CallbackGauge("auth_cache_misses_total", "Fallos del cache de autenticación",
+                      lambda: [((n,), c.misses) for n, c in _caches], ("cache",), type_="counter")
+metrics.CallbackGauge("auth_cache_entries", "Entradas en el cache de autenticación",
+                      lambda: [((n,), len(c)) for n, c in _caches], ("cache",))
+
 def create_token(user_id: int, email: str) -> str:
     now = datetime.datetime.utcnow()
     payload = {
@@ -33,11 +62,11 @@ def create_token(user_id: int, email: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=ALGO)
 
-def get_current_user(
-    db: Session = Depends(get_db),
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db),
     access_token: str | None = Cookie(default=None),
     authorization: str | None = Header(default=None)
-) -> User:
+) -> UserOut:
     token = access_token
     if not token and authorization:  # Authorization: Bearer <token>
         parts = authorization.split()
@@ -47,12 +76,32 @@ def get_current_user(
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No token")
 
-    try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=[ALGO])
-    except JWTError:
+    key = _token_key(token)
+    data = claims_cache.get(key)
+    if data is None:
+        try:
+            data = jwt.decode(token, JWT_SECRET, algorithms=[ALGO])
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+        # no se cachea más allá de la expiración del token
+        claims_cache.set(key, data, ttl=data.get("exp", 0) - time.time())
+    elif data.get("exp", 0) <= time.time():
+        claims_cache.pop(key)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
 
-    user = db.query(User).filter(User.id == int(data.get("sub", "0"))).first()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario no encontrado")
+    user_id = int(data.get("sub", "0"))
+    user = user_cache.get(user_id)
+    if user is None:
+        row = await db.get(User, user_id)
+        if not row:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario no encontrado")
+        user = UserOut.model_validate(row)
+        user_cache.set(user_id, user)
+    return user
+
+ADMIN_EMAILS = {e.strip().lower() for e in settings.ADMIN_EMAILS.split(",") if e.strip()}
+
+async def require_admin(user: UserOut = Depends(get_current_user)) -> UserOut:
+    if user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo administradores")
     return user
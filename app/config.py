@@ -7,10 +7,112 @@ class Settings:
 
     WG_HOST = os.getenv("WG_HOST", "localhost")
     TEAMS_JSON = os.getenv("TEAMS_JSON", "[]")
+    # Si se define, el roster se lee de este archivo y se recarga al cambiar su mtime (o con SIGHUP)
+    TEAMS_FILE = os.getenv("TEAMS_FILE", "").strip()
+    TEAMS_RELOAD_S = float(os.getenv("TEAMS_RELOAD_S", "5"))
     LOGO_UAEMEX_URL = os.getenv("LOGO_UAEMEX_URL", "").strip()
     LOGO_ING_URL = os.getenv("LOGO_ING_URL", "").strip()
 
+    # Intervalo por defecto entre sondeos de cada equipo (cada equipo puede
+    # sobreescribirlo con "interval" en TEAMS_JSON)
+    PROBE_INTERVAL_S = float(os.getenv("PROBE_INTERVAL_S", "5"))
+    # Muestras por equipo en el historial en memoria (17280 = 24h a 5s)
+    HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "60"))
+
+    # Historial persistente de sondeos (tablas probe_samples / probe_rollups)
+    PROBE_STORE_FLUSH_S = float(os.getenv("PROBE_STORE_FLUSH_S", "5"))
+    PROBE_STORE_MAX_PENDING = int(os.getenv("PROBE_STORE_MAX_PENDING", "50000"))
+    PROBE_ROLLUP_EVERY_S = float(os.getenv("PROBE_ROLLUP_EVERY_S", "60"))
+    PROBE_RETENTION_RAW_H = float(os.getenv("PROBE_RETENTION_RAW_H", "48"))
+    PROBE_RETENTION_1M_D = float(os.getenv("PROBE_RETENTION_1M_D", "14"))
+    PROBE_RETENTION_1H_D = float(os.getenv("PROBE_RETENTION_1H_D", "365"))
+    HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "1500"))
+
+    # Cliente HTTP de sondeos: un pool chico por equipo, tantos como equipos en el roster
+    # (KEEPALIVE es el mínimo); CONNECTIONS acota las conexiones en uso a la vez
+    PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "50"))
+    PROBE_MAX_CONNECTIONS = int(os.getenv("PROBE_MAX_CONNECTIONS", "100"))
+    PROBE_MAX_KEEPALIVE = int(os.getenv("PROBE_MAX_KEEPALIVE", "100"))
+    PROBE_KEEPALIVE_EXPIRY_S = float(os.getenv("PROBE_KEEPALIVE_EXPIRY_S", "30"))
+    PROBE_DNS_TTL_S = float(os.getenv("PROBE_DNS_TTL_S", "60"))
+
+    # Varios workers (uvicorn --workers N): uno gana un file lock y sondea; los
+    # demás leen el estado que publica en SHARED_STATE_DIR (idealmente tmpfs)
+    SHARED_STATE = os.getenv("SHARED_STATE", "0").lower() in ("1", "true", "yes")
+    SHARED_STATE_DIR = Path(os.getenv("SHARED_STATE_DIR", "/dev/shm/principal-isi" if Path("/dev/shm").is_dir() else "/tmp/principal-isi"))
+    SHARED_STATE_SYNC_S = float(os.getenv("SHARED_STATE_SYNC_S", "1"))
+    # cada cuánto el líder escribe el estado completo; entre medio solo publica lo nuevo
+    SHARED_STATE_CHECKPOINT_S = float(os.getenv("SHARED_STATE_CHECKPOINT_S", "300"))
+
+    # Respuestas JSON con orjson (si está instalado); 0 vuelve al json de la stdlib
+    FAST_JSON = os.getenv("FAST_JSON", "1").lower() in ("1", "true", "yes")
+
+    # /diag: timeout por equipo y plazo global de todo el chequeo
+    DIAG_TIMEOUT_S = float(os.getenv("DIAG_TIMEOUT_S", "0.8"))
+    DIAG_DEADLINE_S = float(os.getenv("DIAG_DEADLINE_S", "3"))
+
+    # Timeout adaptativo por equipo: p99 de la latencia reciente * K, acotado
+    PROBE_TIMEOUT_K = float(os.getenv("PROBE_TIMEOUT_K", "3"))
+    PROBE_TIMEOUT_MIN_S = float(os.getenv("PROBE_TIMEOUT_MIN_S", "0.25"))
+    PROBE_TIMEOUT_MAX_S = float(os.getenv("PROBE_TIMEOUT_MAX_S", "1.5"))
+    PROBE_CONNECT_TIMEOUT_S = float(os.getenv("PROBE_CONNECT_TIMEOUT_S", "0.3"))
+    # Circuit breaker: fallos seguidos antes de abrir y backoff exponencial
+    PROBE_BREAKER_FAILURES = int(os.getenv("PROBE_BREAKER_FAILURES", "3"))
+    PROBE_BACKOFF_BASE_S = float(os.getenv("PROBE_BACKOFF_BASE_S", "10"))
+    PROBE_BACKOFF_MAX_S = float(os.getenv("PROBE_BACKOFF_MAX_S", "300"))
+
+    # Bitácora de actividad (cola en memoria + writer por lotes)
+    ACTIVITY_QUEUE_MAX = int(os.getenv("ACTIVITY_QUEUE_MAX", "10000"))
+    ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "500"))
+    ACTIVITY_FLUSH_INTERVAL_S = float(os.getenv("ACTIVITY_FLUSH_INTERVAL_S", "1.0"))
+
+    # Particiones (Postgres) y retención de la bitácora
+    ACTIVITY_PARTITION = os.getenv("ACTIVITY_PARTITION", "month")  # month | day
+    ACTIVITY_PARTITIONS_AHEAD = int(os.getenv("ACTIVITY_PARTITIONS_AHEAD", "2"))
+    ACTIVITY_RETENTION_D = float(os.getenv("ACTIVITY_RETENTION_D", "90"))
+    ACTIVITY_RETENTION_MODE = os.getenv("ACTIVITY_RETENTION_MODE", "drop")  # drop | detach (archivar)
+    ACTIVITY_MAINTAIN_EVERY_S = float(os.getenv("ACTIVITY_MAINTAIN_EVERY_S", "3600"))
+
+    # Rollups por hora de la bitácora (/api/activity/stats)
+    ACTIVITY_ROLLUP_EVERY_S = float(os.getenv("ACTIVITY_ROLLUP_EVERY_S", "300"))
+    ACTIVITY_ROLLUP_LAG_S = float(os.getenv("ACTIVITY_ROLLUP_LAG_S", "60"))
+    ACTIVITY_ROLLUP_CHUNK = int(os.getenv("ACTIVITY_ROLLUP_CHUNK", "50000"))
+    ACTIVITY_ROLLUP_RETENTION_D = float(os.getenv("ACTIVITY_ROLLUP_RETENTION_D", "400"))
+
+    # Cache de tokens/usuarios en get_current_user
+    AUTH_CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "300"))
+    AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+
+    # Pool de procesos para bcrypt (registro/login)
+    HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+    HASH_QUEUE_MAX = int(os.getenv("HASH_QUEUE_MAX", "16"))
+    HASH_RETRY_AFTER_S = int(os.getenv("HASH_RETRY_AFTER_S", "2"))
+
+    # Control de admisión: requests en curso por clase (critical = /health y /metrics, sin cupo)
+    ADMIT_LIMITS = os.getenv("ADMIT_LIMITS", "monitor=256,stream=1000,auth=32,api=128,pages=128,static=256")
+    ADMIT_RETRY_AFTER_S = int(os.getenv("ADMIT_RETRY_AFTER_S", "1"))
+    # Token bucket por IP para /api/login y /api/register
+    AUTH_RATE_PER_S = float(os.getenv("AUTH_RATE_PER_S", "1"))
+    AUTH_RATE_BURST = float(os.getenv("AUTH_RATE_BURST", "10"))
+    AUTH_RATE_MAX_CLIENTS = int(os.getenv("AUTH_RATE_MAX_CLIENTS", "50000"))
+
+    # Instrumentación de requests: Server-Timing, log de lentos y profiling bajo demanda
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+    SLOW_REQUEST_KEEP = int(os.getenv("SLOW_REQUEST_KEEP", "100"))
+    PROFILE_TOP = int(os.getenv("PROFILE_TOP", "40"))
+    # Consultas SQL: log de lentas (SQL normalizado) y aviso de consultas repetidas en un request
+    DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+    DB_SLOW_QUERY_KEEP = int(os.getenv("DB_SLOW_QUERY_KEEP", "100"))
+    DB_REPEAT_WARN = int(os.getenv("DB_REPEAT_WARN", "10"))
+    # Correos con acceso a /api/admin (separados por coma)
+    ADMIN_EMAILS = os.getenv("ADMIN_EMAILS", "")
+
+    # Buckets (segundos) de los histogramas de /metrics
+    PROBE_LATENCY_BUCKETS = os.getenv("PROBE_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,1.5,2.5")
+    HTTP_LATENCY_BUCKETS = os.getenv("HTTP_LATENCY_BUCKETS", "0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5")
+
     BASE_DIR = Path(__file__).resolve().parent
     STATIC_DIR = BASE_DIR / "static"
+    ASSET_DIR = Path(os.getenv("ASSET_DIR", str(BASE_DIR / "static_dist")))  # estáticos con hash
 
 settings = Settings()
@@ -1,5 +1,11 @@
+from typing import AsyncIterator, Iterator
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db import get_db
+from db import get_db, get_async_db
 
-def db_session() -> Session:
-    return get_db()
+def db_session() -> Iterator[Session]:
+    yield from get_db()
+
+async def async_db_session() -> AsyncIterator[AsyncSession]:
+    async for db in get_async_db():
+        yield db
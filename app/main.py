@@ -1,53 +1,146 @@
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 # ---- importa tu stack existente
-from middleware import activity_middleware
-from db import Base, engine
-from routers import public, auth as auth_router, pages
+from middleware import activity_middleware, metrics_middleware, timing_middleware, admission_middleware
+from db import async_engine
+from routers import public, auth as auth_router, pages, admin, activity
+from services import monitor, probe_client, probe_store, activity_log, hashing, registry, assets, cluster, schema, activity_stats
+from services.fastjson import FastJSONResponse
+from services.assets import AssetFiles
+from services.http_cache import CompiledPage
+from config import settings
 
 APP_TITLE = "Principal_2025_ISI"
 APP_VERSION = "1.5.0"
 
-app = FastAPI(title=APP_TITLE, version=APP_VERSION)
+app = FastAPI(title=APP_TITLE, version=APP_VERSION, default_response_class=FastJSONResponse)
 
 # ---- estáticos (servir build de Angular)
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
+UI_DIR = STATIC_DIR / "ui"
 
 if STATIC_DIR.is_dir():
-    app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+    # nombres con hash + .gz/.br (normalmente ya generados en el build de la imagen)
+    try:
+        assets.build()
+    except Exception as ex:
+        print(f"[WARN] No se pudieron preparar estáticos: {ex}")
+        assets.load_manifest()
+    app.mount("/static", AssetFiles(directory=str(STATIC_DIR)), name="static")
+    if settings.ASSET_DIR.is_dir():
+        app.mount("/assets", AssetFiles(directory=str(settings.ASSET_DIR)), name="assets")
 else:
     print(f"[WARN] Directorio de estáticos no encontrado: {STATIC_DIR}")
 
+ui_files = AssetFiles(directory=str(UI_DIR), check_dir=False)
+_spa_index: CompiledPage | None = None
+
 # ---- middleware + DB init
 activity_middleware(app)
+metrics_middleware(app)
+timing_middleware(app)  # el último registrado es el más externo: mide todo el request
+admission_middleware(app)  # y por fuera de todo, el control de admisión: rechaza sin tocar lo demás
 
 @app.on_event("startup")
 def _create_tables():
+    # tablas, índices faltantes y (en Postgres) particiones de la bitácora
     try:
-        Base.metadata.create_all(bind=engine)
+        schema.bootstrap()
     except Exception as ex:
         print(f"[WARN] No se pudieron crear tablas: {ex}")
 
+@app.on_event("startup")
+async def _start_schema_maintenance():
+    await schema.start()
+
+@app.on_event("shutdown")
+async def _stop_schema_maintenance():
+    await schema.stop()
+
+@app.on_event("startup")
+async def _start_activity_rollups():
+    await activity_stats.start()
+
+@app.on_event("shutdown")
+async def _stop_activity_rollups():
+    await activity_stats.stop()
+
+@app.on_event("startup")
+def _compile_pages():
+    global _spa_index
+    pages.compile_pages()
+    for index_path in (UI_DIR / "index.html", STATIC_DIR / "index.html"):
+        if index_path.is_file():
+            _spa_index = CompiledPage(index_path.read_bytes())
+            break
+
+@app.on_event("startup")
+async def _start_activity_log():
+    await activity_log.start()
+
+@app.on_event("shutdown")
+async def _stop_activity_log():
+    await activity_log.stop()
+
+@app.on_event("startup")
+def _start_hashing():
+    hashing.start()
+
+@app.on_event("shutdown")
+def _stop_hashing():
+    hashing.stop()
+
+@app.on_event("startup")
+async def _start_monitor():
+    registry.load()
+    registry.start_watcher()
+    await probe_client.start()
+    await probe_store.start()
+    if settings.SHARED_STATE:
+        await cluster.start()  # solo el worker líder arranca el scheduler
+    else:
+        monitor.start_scheduler(settings.PROBE_INTERVAL_S)
+
+@app.on_event("shutdown")
+async def _stop_monitor():
+    await registry.stop_watcher()
+    if settings.SHARED_STATE:
+        await cluster.stop()
+    await monitor.stop_scheduler()
+    await probe_store.stop()
+    await probe_client.close()
+
+@app.on_event("shutdown")
+async def _close_db():
+    # al final: la bitácora y el historial ya vaciaron sus colas
+    await async_engine.dispose()
+
 # ---- incluye tus routers API/páginas
 app.include_router(public.router)
 app.include_router(auth_router.router)
 app.include_router(pages.router)
+app.include_router(admin.router)
+app.include_router(activity.router)
 
 # ---- health
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
-# ---- fallback SPA (Angular): cualquier ruta no-API devuelve index.html
+# ---- fallback SPA (Angular): archivos de static/ui o, si no existen, index.html
 @app.get("/{full_path:path}", response_class=HTMLResponse)
-def spa_fallback(full_path: str):
+async def spa_fallback(full_path: str, request: Request):
     if full_path.startswith("api"):
         raise HTTPException(status_code=404)
-    index_path = STATIC_DIR / "index.html"
-    if index_path.exists():
-        return FileResponse(index_path)
+    if full_path.startswith("ui/"):
+        try:
+            return await ui_files.get_response(full_path[3:], request.scope)
+        except StarletteHTTPException:
+            pass  # ruta del router de Angular
+    if _spa_index is not None:
+        return _spa_index.response(request)
     return HTMLResponse("<h1>Build Angular no encontrado</h1>", status_code=500)
@@ -1,32 +1,107 @@
+import math, time
 from fastapi import Request
+from fastapi.responses import JSONResponse
 from typing import Callable
-from db import SessionLocal
-from models import Activity
+from config import settings
+from services import activity_log, admission, metrics, query_stats, timing
+
+m_requests = metrics.Counter("http_requests_total", "Requests HTTP por ruta, método y status", ("route", "method", "status"))
+m_request_seconds = metrics.Histogram(
+    "http_request_duration_seconds", "Duración de requests HTTP hasta el inicio de la respuesta",
+    metrics.parse_buckets(settings.HTTP_LATENCY_BUCKETS), ("route", "method"),
+)
+
+def _route_template(request: Request) -> str:
+    # plantilla de la ruta (p. ej. "/{full_path:path}") para no explotar la cardinalidad
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def metrics_middleware(app):
+    @app.middleware("http")
+    async def http_metrics(request: Request, call_next: Callable):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = _route_template(request)
+            m_request_seconds.observe(time.perf_counter() - started, (route, request.method))
+            m_requests.inc((route, request.method, str(status)))
+
+class _Admission:
+    """Middleware ASGI puro: el cupo se libera cuando la app terminó de enviar
+    la respuesta (incluye SSE/streaming y clientes que cortan a la mitad)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        cls = admission.classify(scope["path"])
+        if cls in admission.RATE_LIMITED:
+            client = scope.get("client")
+            wait = admission.take_token(client[0] if client else "-")
+            if wait:
+                response = JSONResponse(
+                    {"detail": "Demasiados intentos, espera un momento"}, status_code=429,
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+                return await response(scope, receive, send)
+        if not admission.try_acquire(cls):
+            response = JSONResponse(
+                {"detail": "Servidor ocupado, intenta de nuevo"}, status_code=503,
+                headers={"Retry-After": str(settings.ADMIT_RETRY_AFTER_S)},
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(cls)
+
+def admission_middleware(app):
+    app.add_middleware(_Admission)
+
+def timing_middleware(app):
+    @app.middleware("http")
+    async def server_timing(request: Request, call_next: Callable):
+        # fases con nombre (db, db_wait, hash, probe, render) -> header Server-Timing
+        phases = timing.begin()
+        queries = query_stats.begin()
+        path = request.url.path
+        profiling = timing.current() if timing.wants(path) else None
+        if profiling is not None:
+            timing.enter()
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            if profiling is not None:
+                timing.leave(profiling)
+        total = time.perf_counter() - started
+        response.headers["Server-Timing"] = timing.header(phases, total, queries.count)
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            timing.note_slow(request.method, path, response.status_code, phases, total, queries.count)
+        query_stats.finish(queries, request.method, path)
+        return response
 
 def activity_middleware(app):
     @app.middleware("http")
     async def log_activity(request: Request, call_next: Callable):
-        # evita ruido de /static y /health
-        if request.url.path.startswith("/static") or request.url.path == "/health":
+        # evita ruido de estáticos y /health
+        if request.url.path.startswith(("/static", "/assets")) or request.url.path == "/health":
             return await call_next(request)
 
         response = await call_next(request)
-        try:
-            db = SessionLocal()
-            ua = request.headers.get("user-agent", "")
-            ip = request.client.host if request.client else None
-            db.add(Activity(
-                user_id=None,
-                path=request.url.path,
-                method=request.method,
-                user_agent=ua,
-                remote_ip=ip,
-                detail=None
-            ))
-            db.commit()
-        except Exception:
-            pass
-        finally:
-            try: db.close()
-            except: pass
+        # solo se encola: el INSERT lo hace el writer de activity_log por lotes
+        activity_log.enqueue({
+            "user_id": None,
+            "path": request.url.path,
+            "method": request.method,
+            "user_agent": request.headers.get("user-agent", ""),
+            "remote_ip": request.client.host if request.client else None,
+            "detail": None,
+        })
         return response
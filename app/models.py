@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Text, Float, SmallInteger, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from db import Base
 
+# ids de tablas que crecen con cada sondeo/request: BIGINT (a 500 equipos cada 5s
+# probe_samples pasa 2^31 ids en ~250 días). sqlite solo autoincrementa la PK
+# si es INTEGER, y ahí ya es de 64 bits.
+BigId = BigInteger().with_variant(Integer, "sqlite")
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -12,11 +17,63 @@ class User(Base):
 
 class Activity(Base):
     __tablename__ = "activities"
-    id = Column(Integer, primary_key=True)
+    id = Column(BigId, primary_key=True)
     user_id = Column(Integer, nullable=True)
     path = Column(String(512))
     method = Column(String(16))
     user_agent = Column(Text)
     remote_ip = Column(String(64))
     detail = Column(Text, nullable=True)
-    ts = Column(DateTime(timezone=True), server_default=func.now())
+    ts = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # en Postgres la tabla se particiona por rango de ts (ver services/schema.py)
+    __table_args__ = (
+        Index("ix_activities_ts", "ts"),
+        Index("ix_activities_path_ts", "path", "ts"),
+        Index("ix_activities_user_id", "user_id"),
+    )
+
+class ProbeSample(Base):
+    __tablename__ = "probe_samples"
+    id = Column(BigId, primary_key=True)
+    team = Column(String(255), nullable=False)
+    ts = Column(DateTime(timezone=True), nullable=False)
+    up = Column(SmallInteger, nullable=False)
+    latency_ms = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    __table_args__ = (Index("ix_probe_samples_team_ts", "team", "ts"), Index("ix_probe_samples_ts", "ts"))
+
+class ProbeRollup(Base):
+    __tablename__ = "probe_rollups"
+    id = Column(BigId, primary_key=True)
+    resolution = Column(String(8), nullable=False)  # "1m" | "1h"
+    team = Column(String(255), nullable=False)
+    bucket = Column(DateTime(timezone=True), nullable=False)  # inicio del intervalo
+    samples = Column(Integer, nullable=False)
+    ups = Column(Integer, nullable=False)
+    errors = Column(Integer, nullable=False)
+    lat_min = Column(Integer, nullable=True)
+    lat_avg = Column(Float, nullable=True)
+    lat_max = Column(Integer, nullable=True)
+    lat_p95 = Column(Integer, nullable=True)
+    __table_args__ = (
+        UniqueConstraint("resolution", "team", "bucket", name="uq_probe_rollups_res_team_bucket"),
+        Index("ix_probe_rollups_res_bucket", "resolution", "bucket"),
+    )
+
+class ActivityRollup(Base):
+    # conteos por hora de la bitácora; dim: total | path | method | user | ip
+    # (los clientes distintos de una hora son sus filas con dim = "ip")
+    __tablename__ = "activity_rollups"
+    id = Column(BigId, primary_key=True)
+    dim = Column(String(8), nullable=False)
+    hour = Column(DateTime(timezone=True), nullable=False)
+    key = Column(String(512), nullable=False)
+    count = Column(Integer, nullable=False)
+    __table_args__ = (UniqueConstraint("dim", "hour", "key", name="uq_activity_rollups_dim_hour_key"),)
+
+class JobMark(Base):
+    # high-water mark de jobs incrementales (último id procesado)
+    __tablename__ = "job_marks"
+    name = Column(String(64), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
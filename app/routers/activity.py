@@ -0,0 +1,33 @@
+import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import get_current_user
+from deps import async_db_session
+from services import activity_stats, state
+
+# Estadísticas de la bitácora; leen solo los rollups por hora (activity_rollups)
+router = APIRouter(prefix="/api/activity", dependencies=[Depends(get_current_user)])
+
+def _dt(ts: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(ts, activity_stats.UTC)
+
+@router.get("/stats")
+async def stats(
+    from_ts: float | None = Query(default=None, alias="from"),
+    to: float | None = None,
+    dim: str = "path",
+    limit: int = Query(default=20, ge=1, le=500),
+    db: AsyncSession = Depends(async_db_session),
+):
+    if dim not in activity_stats.DIMS:
+        raise HTTPException(status_code=400, detail=f"dim debe ser uno de {','.join(activity_stats.DIMS)}")
+    end = to if to is not None else state.now_ts()
+    start = from_ts if from_ts is not None else end - 86400
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' debe ser menor que 'to'")
+    # las horas son buckets completos: [hora de from, hora de to]
+    start_h = activity_stats.hour_floor(_dt(start))
+    end_h = activity_stats.hour_floor(_dt(end)) + datetime.timedelta(hours=1)
+    out = await activity_stats.stats(db, start_h, end_h, dim, limit)
+    return {"from": start_h.timestamp(), "to": end_h.timestamp(), "dim": dim, **out}
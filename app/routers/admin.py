@@ -0,0 +1,60 @@
+import inspect
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from starlette.routing import Match
+
+from auth import require_admin
+from services import query_stats, timing
+
+# Herramientas de diagnóstico; solo para los correos de ADMIN_EMAILS
+router = APIRouter(prefix="/api/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/slow")
+def slow_requests():
+    # últimos requests que pasaron SLOW_REQUEST_MS, con su desglose por fase
+    return {"requests": timing.recent_slow()}
+
+@router.get("/slow-queries")
+def slow_queries():
+    # últimas sentencias que pasaron DB_SLOW_QUERY_MS, con el SQL normalizado
+    return {"queries": query_stats.recent_slow()}
+
+def _sync_endpoint(request: Request, path: str) -> str | None:
+    """Nombre del endpoint `def` (corre en el threadpool) que atiende `path`, si lo hay."""
+    scope = {"type": "http", "path": path, "method": "GET"}
+
+    def routes(items):
+        # include_router puede dejar un envoltorio con el router original adentro
+        for route in items:
+            inner = getattr(route, "original_router", None)
+            yield from routes(inner.routes) if inner is not None else (route,)
+
+    for route in routes(request.app.routes):
+        if isinstance(route, APIRoute) and route.matches(scope)[0] == Match.FULL:
+            return None if inspect.iscoroutinefunction(route.endpoint) else route.endpoint.__name__
+    return None
+
+@router.post("/profile")
+def start_profile(request: Request,
+                  path: str = Query(..., description="ruta exacta de un endpoint async, p. ej. /status"),
+                  requests: int = Query(default=20, ge=1, le=1000)):
+    # perfila con cProfile los próximos `requests` requests a `path`
+    sync = _sync_endpoint(request, path)
+    if sync:
+        raise HTTPException(status_code=400, detail=f"{path} ({sync}) es síncrona y corre en el threadpool: "
+                                                    "el profiler solo ve el hilo del event loop")
+    return timing.arm(path, requests)
+
+@router.get("/profile")
+def profile_status(format: str = "json"):
+    st = timing.status()
+    if format == "text":
+        return PlainTextResponse(st.get("report") or f"pendiente: {st.get('done', 0)}/{st.get('requests', 0)}\n")
+    return st
+
+@router.delete("/profile")
+def cancel_profile():
+    timing.cancel()
+    return {"ok": True}
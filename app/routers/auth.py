@@ -1,27 +1,42 @@
-from fastapi import APIRouter, Depends, Response, HTTPException, status
-from sqlalchemy.orm import Session
-from deps import db_session
+from fastapi import APIRouter, Depends, HTTPException, status, Cookie
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from deps import async_db_session
 from models import User
 from schemas import UserCreate, LoginIn, UserOut
-from auth import hash_password, verify_password, create_token, get_current_user
+from auth import create_token, get_current_user, invalidate_token, invalidate_user
+from services.hashing import hash_password, verify_password
+from services.fastjson import FastJSONResponse
+
+# Las rutas devuelven la respuesta ya armada: el modelo se valida una vez al
+# construir UserOut y FastAPI no vuelve a recorrer el dict con jsonable_encoder.
 
 router = APIRouter(prefix="/api")
 
 @router.post("/register")
-def api_register(payload: UserCreate, db: Session = Depends(db_session)):
-    exists = db.query(User).filter(User.email == payload.email).first()
+async def api_register(payload: UserCreate, db: AsyncSession = Depends(async_db_session)):
+    exists = await db.scalar(select(User.id).where(User.email == payload.email))
     if exists:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Correo ya registrado")
-    user = User(email=payload.email, full_name=payload.full_name, password=hash_password(payload.password))
-    db.add(user); db.commit(); db.refresh(user)
-    return {"ok": True, "user": UserOut.model_validate(user).model_dump()}
+    user = User(email=payload.email, full_name=payload.full_name, password=await hash_password(payload.password))
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError:  # registro concurrente con el mismo correo
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Correo ya registrado")
+    await db.refresh(user)
+    invalidate_user(user.id)
+    return FastJSONResponse({"ok": True, "user": UserOut.model_validate(user).model_dump(mode="json")})
 
 @router.post("/login")
-def api_login(payload: LoginIn, response: Response, db: Session = Depends(db_session)):
-    user = db.query(User).filter(User.email == payload.email).first()
-    if not user or not verify_password(payload.password, user.password):
+async def api_login(payload: LoginIn, db: AsyncSession = Depends(async_db_session)):
+    user = await db.scalar(select(User).where(User.email == payload.email))
+    if not user or not await verify_password(payload.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales inválidas")
     token = create_token(user.id, user.email)
+    response = FastJSONResponse({"ok": True, "user": UserOut.model_validate(user).model_dump(mode="json")})
     response.set_cookie(
         key="access_token",
         value=token,
@@ -31,13 +46,15 @@ def api_login(payload: LoginIn, response: Response, db: Session = Depends(db_ses
         path="/",
         # secure=True,  # habilitar en HTTPS
     )
-    return {"ok": True, "user": UserOut.model_validate(user).model_dump()}
+    return response
 
 @router.post("/logout")
-def api_logout(response: Response):
+async def api_logout(access_token: str | None = Cookie(default=None)):
+    invalidate_token(access_token)
+    response = FastJSONResponse({"ok": True})
     response.delete_cookie("access_token", path="/")
-    return {"ok": True}
+    return response
 
 @router.get("/me")
-def api_me(user: User = Depends(get_current_user)):
-    return UserOut.model_validate(user).model_dump()
+async def api_me(user: UserOut = Depends(get_current_user)):
+    return FastJSONResponse(user.model_dump(mode="json"))
@@ -1,21 +1,22 @@
-from fastapi import APIRouter, Depends
+import hashlib, html
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi.responses import HTMLResponse
 from auth import get_current_user
-from models import User
+from schemas import UserOut
 from config import settings
+from services.assets import asset_url
+from services.http_cache import CompiledPage, etag_matches
 
 router = APIRouter()
 
-@router.get("/login", response_class=HTMLResponse)
-def login_form():
-    return """
+LOGIN_HTML = """
 <!DOCTYPE html>
 <html lang="es">
 <head>
   <meta charset="utf-8"/>
   <meta name="viewport" content="width=device-width, initial-scale=1"/>
   <title>Iniciar sesión — Principal ISI</title>
-  <link rel="stylesheet" href="/static/style.css">
+  <link rel="stylesheet" href="__CSS__">
 </head>
 <body class="bg-tech">
   <main class="login-card" role="main">
@@ -119,11 +120,9 @@ def login_form():
 </html>
 """
 
-@router.get("/app", response_class=HTMLResponse)
-def app_home(user: User = Depends(get_current_user)):
-    html = """
+APP_HTML = """
 <!DOCTYPE html><html lang="es"><meta charset="utf-8"/>
-<head><link rel="stylesheet" href="/static/style.css"></head>
+<head><link rel="stylesheet" href="__CSS__"></head>
 <body class="page">
   <div class="container" style="padding:2rem;">
     <h2>Hola __USER__</h2>
@@ -132,23 +131,14 @@ def app_home(user: User = Depends(get_current_user)):
   </div>
 </body></html>
 """
-    display_name = (user.full_name or user.email or "").strip()
-    html = html.replace("__USER__", display_name)
-    return HTMLResponse(html)
-
-@router.get("/", response_class=HTMLResponse)
-def root():
-    host = settings.WG_HOST
-    uaemex = settings.LOGO_UAEMEX_URL.strip()
-    ing = settings.LOGO_ING_URL.strip()
 
-    html = """<!DOCTYPE html>
+DASHBOARD_HTML = """<!DOCTYPE html>
 <html lang='es'>
 <head>
 <meta charset='utf-8'/>
 <meta name='viewport' content='width=device-width, initial-scale=1'/>
 <title>Principal ISI - Dashboard</title>
-<link rel='stylesheet' href='/static/style.css'>
+<link rel='stylesheet' href='__CSS__'>
 </head>
 <body class="page">
 <div class='container'>
@@ -164,10 +154,17 @@ def root():
 <div class='grid'>
 <section class='card'>
 <h2 style='margin:0 0 12px 0;'>Servicios (estado en vivo)</h2>
-<div class='muted' style='margin-bottom:8px;'>Se actualiza cada 5s</div>
+<div class='muted' style='margin-bottom:8px;'>Se actualiza en vivo</div>
 
 <div class='toolbar'>
   <input id='q' placeholder='Buscar por equipo/asignatura/repositorio' class='input'/>
+  <select id='tag' class='input'><option value=''>Todas las asignaturas</option></select>
+  <select id='st' class='input'>
+    <option value=''>Todos los estados</option>
+    <option value='up'>UP</option>
+    <option value='down'>DOWN</option>
+    <option value='unknown'>UNKNOWN</option>
+  </select>
   <button id='sortLat' class='btn-secondary'>Ordenar por Latencia</button>
   <button id='sortUp'  class='btn-secondary'>Ordenar por Uptime</button>
   <span id='lastTs' class='muted'></span>
@@ -188,93 +185,243 @@ def root():
 <tbody id='tbody'><tr><td colspan='8' class='muted'>Cargando...</td></tr></tbody>
 </table>
 </div>
+<div class='toolbar'>
+  <button id='prev' class='btn-secondary'>Anterior</button>
+  <button id='next' class='btn-secondary'>Siguiente</button>
+  <span id='pageInfo' class='muted'></span>
+</div>
 </section>
 </div>
 
 </div> <!-- container -->
 
 <script>
-let lastData = [];
-let sortMode = null; // 'lat' | 'up' | null
+// El servidor filtra, ordena y pagina (/status?q=&tag=&status=&sort=&limit=&offset=);
+// aquí solo se actualizan las filas que cambiaron, identificadas por nombre.
+const PAGE = 100;
+let sortMode = null; // 'latency' | '-uptime' | null
+let offset = 0, total = 0;
+const rowsByName = new Map(); // name -> {tr, cells, data}
+let emptyRow = null;
+
+function setText(el, txt){ if(el.textContent !== txt) el.textContent = txt; }
+
+function setLink(td, href){
+  href = href || '';
+  if(td.dataset.href === href) return;
+  td.dataset.href = href;
+  td.textContent = '';
+  if(href){ const a=document.createElement('a'); a.href=href; a.textContent=href; a.target='_blank'; td.appendChild(a); }
+  else{ td.textContent='-'; }
+}
+
+function buildRow(){
+  const tr = document.createElement('tr');
+  const cells = {};
+  for(const k of ['name','tag','repo','url','status','lat','uptime','err']){
+    cells[k] = document.createElement('td'); tr.appendChild(cells[k]);
+  }
+  cells.pill = document.createElement('span'); cells.status.appendChild(cells.pill);
+  return {tr, cells, data: {}};
+}
+
+function updateRow(entry, row){
+  const c = entry.cells;
+  entry.data = row;
+  setText(c.name, row.name||'-');
+  setText(c.tag, row.tag||'-');
+  setLink(c.repo, row.repo);
+  setLink(c.url, row.external_url);
+  const cls = 'pill '+(row.status==='up'?'up':'down');
+  if(c.pill.className !== cls) c.pill.className = cls;
+  setText(c.pill, (row.status||'unknown').toUpperCase()+(row.cached?' (CACHED)':(row.http?' ('+row.http+')':'')));
+  setText(c.lat, row.latency_ms!=null?row.latency_ms+' ms':'-');
+  setText(c.uptime, row.uptime_pct!=null?row.uptime_pct.toFixed(1)+'%':'-');
+  const e = row.error ? String(row.error) : '';
+  setText(c.err, e ? (e.length>80? e.slice(0,80)+'…': e) : '-');
+}
 
 function renderRows(rows){
   const body = document.getElementById('tbody');
-  body.innerHTML='';
+  const keep = new Set(rows.map(r => r.name));
+  for(const [name, entry] of rowsByName){
+    if(!keep.has(name)){ entry.tr.remove(); rowsByName.delete(name); }
+  }
+  for(const tr of [...body.children]){ if(!tr.dataset.name) tr.remove(); } // "Cargando..." / vacío
+  let cursor = body.firstChild;
   for(const row of rows){
-    const tr = document.createElement('tr');
-
-    const tdName=document.createElement('td'); tdName.textContent=row.name||'-'; tr.appendChild(tdName);
-    const tdTag=document.createElement('td'); tdTag.textContent=row.tag||'-'; tr.appendChild(tdTag);
-
-    const tdRepo=document.createElement('td');
-    if(row.repo){ const a=document.createElement('a'); a.href=row.repo; a.textContent=row.repo; a.target='_blank'; tdRepo.appendChild(a); }
-    else{ tdRepo.textContent='-'; }
-    tr.appendChild(tdRepo);
-
-    const tdUrl=document.createElement('td');
-    if(row.external_url){ const a=document.createElement('a'); a.href=row.external_url; a.textContent=row.external_url; a.target='_blank'; tdUrl.appendChild(a); }
-    else{ tdUrl.textContent='-'; }
-    tr.appendChild(tdUrl);
-
-    const tdStatus=document.createElement('td');
-    const pill=document.createElement('span'); pill.className='pill '+(row.status==='up'?'up':'down');
-    pill.textContent=(row.status||'unknown').toUpperCase()+(row.http?' ('+row.http+')':'');
-    tdStatus.appendChild(pill);
-    tr.appendChild(tdStatus);
-
-    const tdLat=document.createElement('td'); tdLat.textContent=(row.latency_ms!=null?row.latency_ms+' ms':'-'); tr.appendChild(tdLat);
-
-    const tdUptime=document.createElement('td'); tdUptime.textContent=(row.uptime_pct!=null?row.uptime_pct.toFixed(1)+'%':'-'); tr.appendChild(tdUptime);
+    let entry = rowsByName.get(row.name);
+    if(!entry){ entry = buildRow(); entry.tr.dataset.name = row.name; rowsByName.set(row.name, entry); }
+    updateRow(entry, row);
+    // solo se mueve el nodo si no está ya en su lugar
+    if(entry.tr === cursor){ cursor = cursor.nextSibling; }
+    else{ body.insertBefore(entry.tr, cursor); }
+  }
+  if(!rows.length){
+    if(!emptyRow){
+      emptyRow = document.createElement('tr');
+      const td = document.createElement('td'); td.colSpan = 8; td.className = 'muted'; td.textContent = 'Sin resultados';
+      emptyRow.appendChild(td);
+    }
+    body.appendChild(emptyRow);
+  }
+}
 
-    const tdErr=document.createElement('td');
-    if(row.error){ const e = String(row.error); tdErr.textContent = (e.length>80? e.slice(0,80)+'…': e); } else { tdErr.textContent='-'; }
-    tr.appendChild(tdErr);
+function queryString(){
+  const p = new URLSearchParams();
+  const q = (document.getElementById('q').value||'').trim();
+  const tag = document.getElementById('tag').value;
+  const st = document.getElementById('st').value;
+  if(q) p.set('q', q);
+  if(tag) p.set('tag', tag);
+  if(st) p.set('status', st);
+  if(sortMode) p.set('sort', sortMode);
+  p.set('limit', PAGE);
+  p.set('offset', offset);
+  return p.toString();
+}
 
-    body.appendChild(tr);
-  }
+function updatePager(){
+  const shown = Math.min(total, offset + rowsByName.size);
+  setText(document.getElementById('pageInfo'), total ? (offset+1)+'–'+shown+' de '+total : '0 de 0');
+  document.getElementById('prev').disabled = offset <= 0;
+  document.getElementById('next').disabled = offset + PAGE >= total;
 }
 
-function applyFilters(){
-  const q = (document.getElementById('q').value||'').toLowerCase().trim();
-  let rows = lastData.slice();
-  if(q){
-    rows = rows.filter(r =>
-      (r.name||'').toLowerCase().includes(q) ||
-      (r.tag||'').toLowerCase().includes(q) ||
-      (r.repo||'').toLowerCase().includes(q)
-    );
-  }
-  if(sortMode==='lat'){
-    rows.sort((a,b)=>(a.latency_ms||1e9) - (b.latency_ms||1e9));
-  } else if(sortMode==='up'){
-    rows.sort((a,b)=>(b.uptime_pct||0) - (a.uptime_pct||0));
-  }
-  renderRows(rows);
+function setTs(ts){
+  if(!ts) return;
+  const d = new Date(ts*1000);
+  document.getElementById('lastTs').textContent = 'Actualizado: '+d.toLocaleTimeString();
 }
 
+// una sola consulta en vuelo; lo que se pida mientras tanto se junta en una más
+let inflight = false, again = false;
 async function fetchStatus(){
+  if(inflight){ again = true; return; }
+  inflight = true;
   try{
-    const r = await fetch('/status');
+    const r = await fetch('/status?'+queryString());
     if(!r.ok) throw new Error('status '+r.status);
     const data = await r.json();
-    lastData = data.results || [];
-    const lastTs = document.getElementById('lastTs');
-    if(data.ts){ const d = new Date(data.ts*1000); lastTs.textContent = 'Actualizado: '+d.toLocaleTimeString(); }
-    applyFilters();
+    total = data.total || 0;
+    fillTags(data.tags);
+    if(offset > 0 && offset >= total){ offset = Math.max(0, Math.floor((total-1)/PAGE)*PAGE); again = true; }
+    renderRows(data.results || []);
+    setTs(data.ts);
+    updatePager();
   }catch(e){ console.error(e); }
+  finally{
+    inflight = false;
+    if(again){ again = false; fetchStatus(); }
+  }
+}
+
+// si el filtro u orden dependen de datos en vivo, un delta puede mover filas
+let refreshTimer = null;
+function scheduleRefresh(){
+  if(!refreshTimer){ refreshTimer = setTimeout(()=>{ refreshTimer = null; fetchStatus(); }, 2000); }
+}
+function dependsOnLive(){ return !!sortMode || !!document.getElementById('st').value; }
+
+// Polling de respaldo: solo corre mientras el stream SSE no está disponible
+let pollTimer = null;
+function startPolling(){ if(!pollTimer){ fetchStatus(); pollTimer = setInterval(fetchStatus,5000); } }
+function stopPolling(){ if(pollTimer){ clearInterval(pollTimer); pollTimer = null; } }
+
+function connectStream(){
+  if(!window.EventSource){ startPolling(); return; }
+  const es = new EventSource('/status/stream');
+  es.addEventListener('snapshot', (ev)=>{
+    // roster nuevo o reconexión: el evento trae solo {ts, version}; la página vigente se pide a /status
+    stopPolling();
+    setTs(JSON.parse(ev.data).ts);
+    fetchStatus();
+  });
+  es.addEventListener('delta', (ev)=>{
+    const data = JSON.parse(ev.data);
+    for(const ch of data.changes || []){
+      const entry = rowsByName.get(ch.name);
+      if(entry){ updateRow(entry, Object.assign({}, entry.data, ch)); }
+    }
+    setTs(data.ts);
+    if(dependsOnLive()) scheduleRefresh();
+  });
+  es.onerror = ()=>{ startPolling(); };
+}
+
+function fillTags(tags){
+  const sel = document.getElementById('tag');
+  if(sel.options.length > 1 || !tags) return;
+  for(const tag of tags){ const o=document.createElement('option'); o.value=tag; o.textContent=tag; sel.appendChild(o); }
 }
 
+function resetAndFetch(){ offset = 0; fetchStatus(); }
+
 document.addEventListener('DOMContentLoaded',()=>{
-  document.getElementById('q').addEventListener('input', applyFilters);
-  document.getElementById('sortLat').addEventListener('click', ()=>{ sortMode = (sortMode==='lat'? null: 'lat'); applyFilters(); });
-  document.getElementById('sortUp').addEventListener('click',  ()=>{ sortMode = (sortMode==='up' ? null: 'up');  applyFilters(); });
+  let qTimer = null;
+  document.getElementById('q').addEventListener('input', ()=>{ clearTimeout(qTimer); qTimer = setTimeout(resetAndFetch, 250); });
+  document.getElementById('tag').addEventListener('change', resetAndFetch);
+  document.getElementById('st').addEventListener('change', resetAndFetch);
+  document.getElementById('sortLat').addEventListener('click', ()=>{ sortMode = (sortMode==='latency'? null: 'latency'); resetAndFetch(); });
+  document.getElementById('sortUp').addEventListener('click',  ()=>{ sortMode = (sortMode==='-uptime' ? null: '-uptime');  resetAndFetch(); });
+  document.getElementById('prev').addEventListener('click', ()=>{ offset = Math.max(0, offset-PAGE); fetchStatus(); });
+  document.getElementById('next').addEventListener('click', ()=>{ if(offset+PAGE < total){ offset += PAGE; fetchStatus(); } });
 });
 
-fetchStatus(); setInterval(fetchStatus,5000);
+connectStream();
 </script>
 </body>
 </html>"""
-    html = html.replace("__HOST__", host)
-    html = html.replace("__UAEMEX__", uaemex)
-    html = html.replace("__ING__", ing)
-    return HTMLResponse(html)
+
+# ---- páginas compiladas una vez (se recompilan si cambian los settings o el manifest de estáticos)
+_APP_PREFIX, _APP_SUFFIX = b"", b""
+_APP_SHELL_TAG = ""
+_pages: dict[str, CompiledPage] = {}
+_pages_key: tuple | None = None
+
+def _settings_key() -> tuple:
+    # sin URL configurada se usan los escudos incluidos en static/
+    return (
+        settings.WG_HOST,
+        settings.LOGO_UAEMEX_URL or asset_url("uaemex.jpeg"),
+        settings.LOGO_ING_URL or asset_url("ingenieria.jpeg"),
+        asset_url("style.css"),
+    )
+
+def compile_pages() -> None:
+    global _pages, _pages_key, _APP_PREFIX, _APP_SUFFIX, _APP_SHELL_TAG
+    key = _settings_key()
+    host, uaemex, ing, css = (html.escape(v.strip()) for v in key)
+    dashboard = DASHBOARD_HTML.replace("__HOST__", host).replace("__UAEMEX__", uaemex).replace("__ING__", ing)
+    app_shell = APP_HTML.replace("__CSS__", css)
+    _APP_PREFIX, _APP_SUFFIX = (part.encode() for part in app_shell.split("__USER__"))
+    _APP_SHELL_TAG = hashlib.sha256(app_shell.encode()).hexdigest()[:16]
+    _pages = {
+        "login": CompiledPage(LOGIN_HTML.replace("__CSS__", css)),
+        "dashboard": CompiledPage(dashboard.replace("__CSS__", css)),
+    }
+    _pages_key = key
+
+def _page(name: str) -> CompiledPage:
+    if _pages_key != _settings_key():
+        compile_pages()
+    return _pages[name]
+
+@router.get("/login", response_class=HTMLResponse)
+def login_form(request: Request):
+    return _page("login").response(request)
+
+@router.get("/app", response_class=HTMLResponse)
+def app_home(request: Request, user: UserOut = Depends(get_current_user)):
+    _page("login")  # asegura el shell compilado
+    # solo se escapa y sustituye el fragmento del usuario dentro del shell cacheado
+    fragment = html.escape((user.full_name or user.email or "").strip()).encode()
+    etag = f'"{_APP_SHELL_TAG}-{hashlib.sha256(fragment).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), (etag,)):
+        return Response(status_code=304, headers=headers)
+    return Response(_APP_PREFIX + fragment + _APP_SUFFIX, media_type="text/html; charset=utf-8", headers=headers)
+
+@router.get("/", response_class=HTMLResponse)
+def root(request: Request):
+    return _page("dashboard").response(request)
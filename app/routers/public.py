@@ -1,9 +1,13 @@
-from fastapi import APIRouter
-from fastapi.responses import HTMLResponse, JSONResponse
-import httpx
-from typing import Dict, Any
+import asyncio, hashlib, time
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any, List
 from config import settings
-from services import monitor, state
+from deps import async_db_session
+from services import state, probe_client, probe_store, broadcast, registry, monitor, metrics, ring, fastjson, status_query
+from services.http_cache import etag_matches
+from services.fastjson import FastJSONResponse, RawJSONResponse
 
 router = APIRouter()
 
@@ -13,50 +17,237 @@ def health():
 
 @router.get("/teams")
 def teams():
-    return {"host": settings.WG_HOST, "teams": monitor.load_teams(settings.TEAMS_JSON)}
+    return {"host": settings.WG_HOST, "teams": [t.raw for t in registry.current()]}
+
+def _status_body() -> bytes:
+    # cada resultado se codificó una vez; el cuerpo se rearma solo si cambió el snapshot
+    ts = int(state.snapshot_ts or state.now_ts())
+    return fastjson.encode_status(settings.WG_HOST, state.snapshot, ts, state.snapshot_version)
+
+def _csv(raw: str | None) -> List[str]:
+    return [v.strip() for v in raw.split(",") if v.strip()] if raw else []
 
 @router.get("/status")
-async def status():
-    res = await monitor.check_all(settings.WG_HOST, settings.TEAMS_JSON)
-    monitor.update_history(res)
-    for r in res:
-        n = r.get("name") or ""
-        r["uptime_pct"] = monitor.uptime_pct(n)
-        le = monitor.last_err(n)
-        if le and not r.get("error"):
-            r["error"] = le
-    return JSONResponse({"host": settings.WG_HOST, "results": res, "ts": int(state.now_ts())})
+async def status(
+    q: str | None = None,
+    tag: str | None = None,
+    status: str | None = None,
+    sort: str | None = None,
+    limit: int | None = Query(default=None, ge=1, le=5000),
+    offset: int = Query(default=0, ge=0),
+):
+    # Solo lectura: el scheduler de monitor mantiene el snapshot al día.
+    # async a propósito: no bloquea y así las cachés de cuerpos (fastjson,
+    # status_query) solo se tocan desde el thread del loop, sin locks
+    if q is None and tag is None and status is None and sort is None and limit is None and not offset:
+        return RawJSONResponse(_status_body())
+    # Con filtros: se resuelven con los índices del roster (status_query) y la
+    # página se arma con los mismos fragmentos cacheados del cuerpo completo
+    q = (q or "").strip() or None
+    tags, statuses = _csv(tag), _csv(status)
+    if any(s not in status_query.STATUSES for s in statuses):
+        raise HTTPException(status_code=400, detail=f"status debe ser uno o más de {','.join(status_query.STATUSES)}")
+    if sort is not None and sort.lstrip("-") not in status_query.SORTS:
+        raise HTTPException(status_code=400, detail=f"sort debe ser uno de {','.join(status_query.SORTS)} (prefijo - para descendente)")
+    version = state.snapshot_version
+    key = (q, tuple(tags), tuple(statuses), sort, limit, offset)
+    body = status_query.cached_body(key, version)
+    if body is None:
+        snap = state.snapshot
+        names = status_query.select(q, tags, statuses, sort, snap)
+        page = names[offset:offset + limit] if limit is not None else names[offset:]
+        ts = int(state.snapshot_ts or state.now_ts())
+        body = fastjson.encode_page(settings.WG_HOST, snap, page, ts,
+                                    {"total": len(names), "offset": offset, "limit": limit,
+                                     "tags": status_query.index().tags})
+        status_query.store_body(key, version, body)
+    return RawJSONResponse(body)
+
+@router.get("/status/stream")
+async def status_stream(request: Request):
+    # Server-Sent Events: aviso de snapshot al conectar y luego solo deltas por equipo
+    q = broadcast.subscribe()
+
+    async def events():
+        try:
+            yield broadcast.encode("snapshot", monitor.snapshot_event())
+            while broadcast.is_subscribed(q):
+                try:
+                    yield await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": ping\n\n"
+        finally:
+            broadcast.unsubscribe(q)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+_HISTORY_FORMATS = ("rows", "columnar")
+
+def _history_etag(request: Request, team: str | None) -> str:
+    # versión de los datos: última muestra del equipo, o el snapshot completo
+    if team:
+        buf = state.history.get(team)
+        version = f"{len(buf)}:{buf.ts_at(len(buf) - 1)}" if buf else "0"
+    else:
+        version = repr(state.snapshot_ts)
+    digest = hashlib.blake2b(f"{request.url.query}|{version}".encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+def _recent_history(team: str | None, since: float | None, limit: int | None,
+                    fields: tuple, fmt: str) -> Dict[str, Any]:
+    if team:
+        buf = state.history.get(team)
+        bufs = {team: buf} if buf else {}
+    else:
+        bufs = dict(state.history)
+    windows = {name: buf.window(since, limit) for name, buf in bufs.items()}
+    if since is not None and limit is not None:
+        # si algún equipo quedó cortado por limit, el cursor avanza solo hasta su
+        # última muestra y el resto se recorta ahí: nada se salta en el siguiente pedido
+        cut = [bufs[n].ts_at(w.stop - 1) for n, w in windows.items() if w and w.stop < len(bufs[n])]
+        if cut:
+            upto = min(cut)
+            windows = {n: range(w.start, min(w.stop, bufs[n].first_after(upto))) for n, w in windows.items()}
+    cursor = max((bufs[n].ts_at(w.stop - 1) for n, w in windows.items() if w), default=since)
+    render = (lambda b, w: b.columns(w, fields)) if fmt == "columnar" else (lambda b, w: b.rows(w, fields))
+    return {
+        "cursor": cursor,
+        "format": fmt,
+        "fields": list(fields),
+        "series": {n: render(bufs[n], w) for n, w in windows.items()},
+    }
 
 @router.get("/history")
-def history():
-    out = {name: list(buf) for name, buf in state.history.items()}
-    return out
+async def history(
+    request: Request,
+    team: str | None = None,
+    since: float | None = None,
+    limit: int | None = Query(default=None, ge=1),
+    fields: str | None = None,
+    format: str | None = None,
+    from_ts: float | None = Query(default=None, alias="from"),
+    to: float | None = None,
+    resolution: str | None = None,
+    db: AsyncSession = Depends(async_db_session),
+):
+    # Sin rango: ventana en memoria (últimas HISTORY_WINDOW muestras), con ETag
+    # para que los gráficos puedan sondear barato
+    if from_ts is None and to is None and resolution is None:
+        etag = _history_etag(request, team)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), (etag,)):
+            return Response(status_code=304, headers=headers)
+        if since is None and limit is None and fields is None and format is None:
+            if team:
+                buf = state.history.get(team)
+                return FastJSONResponse({team: list(buf) if buf else []}, headers=headers)
+            return FastJSONResponse({name: list(buf) for name, buf in state.history.items()}, headers=headers)
+        wanted = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else ring.FIELDS
+        if not wanted or any(f not in ring.FIELDS for f in wanted):
+            raise HTTPException(status_code=400, detail=f"fields debe ser un subconjunto de {','.join(ring.FIELDS)}")
+        fmt = format or "rows"
+        if fmt not in _HISTORY_FORMATS:
+            raise HTTPException(status_code=400, detail="format debe ser rows o columnar")
+        return FastJSONResponse(_recent_history(team, since, limit, wanted, fmt), headers=headers)
 
-@router.get("/metrics", response_class=HTMLResponse)
-def metrics():
-    return monitor.render_metrics(settings.TEAMS_JSON)
+    now = state.now_ts()
+    end = to if to is not None else now
+    start = from_ts if from_ts is not None else end - 3600
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' debe ser menor que 'to'")
+    if resolution in (None, "auto"):
+        resolution = probe_store.pick_resolution(start, end, now)
+    elif resolution not in ("raw", *probe_store.RESOLUTIONS):
+        raise HTTPException(status_code=400, detail="resolution debe ser auto, raw, 1m o 1h")
+    elif probe_store.too_many_points(start, end, resolution, team):
+        # una resolución explícita no se degrada sola: un rango de meses en crudo
+        # cargaría todo en una respuesta
+        raise HTTPException(status_code=400, detail=f"rango demasiado amplio para resolution={resolution}: "
+                                                    f"más de {settings.HISTORY_MAX_POINTS} puntos por equipo")
+    return {
+        "from": start,
+        "to": end,
+        "resolution": resolution,
+        "series": await probe_store.query(db, team, start, end, resolution),
+    }
 
-@router.get("/diag")
-async def diag():
-    out = {"ok": True, "errors": [], "internal_checks": []}
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # cada familia se re-renderiza solo si cambió desde el scrape anterior
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def _diag_checks(reg, deadline_s: float):
+    """Chequea todos los equipos a la vez y entrega cada resultado al terminar.
+
+    Lo que no terminó dentro de deadline_s se cancela y sale como "deadline".
+    """
+    async def one(t):
+        async with probe_client.slot():
+            return await probe_client.diagnose(t.name, 8000, "/health", timeout=settings.DIAG_TIMEOUT_S)
+
+    tasks = {asyncio.ensure_future(one(t)): t.name for t in reg}
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline_s
+    pending = set(tasks)
     try:
-        data = monitor.load_teams(settings.TEAMS_JSON)
-    except Exception as e:
-        out["ok"] = False
-        out["errors"].append(f"TEAMS_JSON inválido: {e}")
-        data = []
-
-    failed = []
-    async with httpx.AsyncClient() as client:
-        for t in data:
-            name = t.get("name")
-            if not name:
-                continue
-            try:
-                r = await client.get(f"http://{name}:8000/health", timeout=0.8)
-                if not r.is_success:
-                    failed.append({"name": name, "status": r.status_code})
-            except Exception as ex:
-                failed.append({"name": name, "error": str(ex)})
-    out["internal_checks"] = failed
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, end - loop.time()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is not None:
+                    yield {"name": tasks[task], "failure": "error", "error": str(task.exception())}
+                else:
+                    yield task.result()
+        for task in pending:
+            yield {"name": tasks[task], "failure": "deadline", "error": f"sin respuesta en {deadline_s}s",
+                   "total_ms": round(deadline_s * 1000, 1)}
+    finally:
+        for task in pending:
+            task.cancel()
+
+def _diag_summary(reg, checks, started: float) -> Dict[str, Any]:
+    failures: Dict[str, int] = {}
+    for c in checks:
+        if c.get("failure"):
+            failures[c["failure"]] = failures.get(c["failure"], 0) + 1
+    return {
+        "ok": not reg.errors and not failures,
+        "errors": list(reg.errors),
+        "teams": len(checks),
+        "failures": failures,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+@router.get("/diag")
+async def diag(stream: bool = False, deadline: float | None = Query(default=None, gt=0, le=60)):
+    reg = registry.current()
+    deadline_s = deadline or settings.DIAG_DEADLINE_S
+    started = time.perf_counter()
+
+    if stream:
+        # NDJSON: una línea por equipo en cuanto termina y el resumen al final
+        async def lines():
+            checks = []
+            async for c in _diag_checks(reg, deadline_s):
+                checks.append(c)
+                yield fastjson.dumps(c) + b"\n"
+            yield fastjson.dumps({"summary": _diag_summary(reg, checks, started)}) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    checks = [c async for c in _diag_checks(reg, deadline_s)]
+    out = _diag_summary(reg, checks, started)
+    out["checks"] = sorted(checks, key=lambda c: c["name"])
+    # compat: lista de fallidos con la forma de antes
+    out["internal_checks"] = [
+        {"name": c["name"], "status": c["status"]} if c.get("failure") == "http"
+        else {"name": c["name"], "error": c.get("error") or c["failure"]}
+        for c in out["checks"] if c.get("failure")
+    ]
     return out
@@ -0,0 +1,132 @@
+import asyncio, datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import String, insert
+
+from config import settings
+from services import metrics
+from db import async_engine
+from models import Activity
+
+# Bitácora de requests sin bloquear el event loop: el middleware encola la fila
+# y un writer en segundo plano la inserta por lotes (INSERT multi-fila, engine async).
+# Si la cola se llena se descarta la fila y se cuenta en `dropped`.
+# Los textos se recortan al largo de su columna antes de encolar: en Postgres
+# un solo valor largo haría fallar el INSERT del lote entero. Si igual falla un
+# lote, se reintenta fila por fila y solo se pierden las filas que fallen.
+_queue: asyncio.Queue | None = None
+_task: asyncio.Task | None = None
+_inflight: asyncio.Future | None = None
+_leftover: List[Dict[str, Any]] = []  # lote a medio armar cuando se cancela el writer
+counters = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0}
+
+metrics.CallbackGauge("activity_log_queue_depth", "Filas de bitácora en cola", lambda: [((), depth())])
+metrics.CallbackGauge("activity_log_rows_total", "Filas de bitácora por resultado",
+                      lambda: [((k,), v) for k, v in counters.items()], ("result",), type_="counter")
+
+_MAX_LEN = {c.name: c.type.length for c in Activity.__table__.columns
+            if isinstance(c.type, String) and c.type.length}
+
+def enqueue(row: Dict[str, Any]) -> None:
+    if _queue is None:
+        counters["dropped"] += 1
+        return
+    for key, n in _MAX_LEN.items():
+        v = row.get(key)
+        if isinstance(v, str) and len(v) > n:
+            row[key] = v[:n]
+    row.setdefault("ts", datetime.datetime.now(datetime.timezone.utc))
+    try:
+        _queue.put_nowait(row)
+        counters["enqueued"] += 1
+    except asyncio.QueueFull:
+        counters["dropped"] += 1
+
+async def _flush_rows(batch: List[Dict[str, Any]]) -> None:
+    # una sola conexión y una transacción por fila: si la base está caída falla
+    # el connect una vez y no una por fila
+    written, error = 0, None
+    try:
+        async with async_engine.connect() as conn:
+            for row in batch:
+                try:
+                    async with conn.begin():
+                        await conn.execute(insert(Activity), [row])
+                    written += 1
+                except Exception as ex:
+                    error = ex
+    except Exception as ex:
+        error = ex
+    counters["written"] += written
+    if written < len(batch):
+        counters["failed"] += len(batch) - written
+        print(f"[WARN] No se pudo guardar bitácora ({len(batch) - written} de {len(batch)} filas): {error}")
+
+async def _flush(batch: List[Dict[str, Any]]) -> None:
+    try:
+        async with async_engine.begin() as conn:
+            await conn.execute(insert(Activity), batch)
+        counters["written"] += len(batch)
+    except Exception as ex:
+        if len(batch) == 1:
+            counters["failed"] += 1
+            print(f"[WARN] No se pudo guardar bitácora (1 fila): {ex}")
+            return
+        print(f"[WARN] Falló el lote de bitácora ({len(batch)} filas), se reintenta fila por fila: {ex}")
+        await _flush_rows(batch)
+
+def _drain(batch: List[Dict[str, Any]], limit: int) -> None:
+    while len(batch) < limit:
+        try:
+            batch.append(_queue.get_nowait())
+        except asyncio.QueueEmpty:
+            return
+
+async def _writer() -> None:
+    global _inflight
+    loop = asyncio.get_running_loop()
+    size = settings.ACTIVITY_BATCH_SIZE
+    batch: List[Dict[str, Any]] = []
+    try:
+        while True:
+            batch = [await _queue.get()]
+            deadline = loop.time() + settings.ACTIVITY_FLUSH_INTERVAL_S
+            while True:
+                _drain(batch, size)
+                remaining = deadline - loop.time()
+                if len(batch) >= size or remaining <= 0:
+                    break
+                await asyncio.sleep(min(0.05, remaining))
+            # shield: si nos cancelan a mitad del INSERT, stop() espera a que termine
+            _inflight = asyncio.ensure_future(_flush(batch))
+            batch = []
+            await asyncio.shield(_inflight)
+    except asyncio.CancelledError:
+        _leftover.extend(batch)
+        raise
+
+def depth() -> int:
+    return _queue.qsize() if _queue is not None else 0
+
+async def start() -> None:
+    global _queue, _task
+    if _task is not None:
+        return
+    _queue = asyncio.Queue(maxsize=settings.ACTIVITY_QUEUE_MAX)
+    _task = asyncio.create_task(_writer())
+
+async def stop() -> None:
+    """Detiene el writer y guarda lo pendiente antes de apagar."""
+    global _queue, _task, _inflight
+    if _task is None:
+        return
+    _task.cancel()
+    await asyncio.gather(_task, return_exceptions=True)
+    if _inflight is not None:
+        await asyncio.gather(_inflight, return_exceptions=True)
+    pending = list(_leftover)
+    _leftover.clear()
+    _drain(pending, len(pending) + _queue.qsize())
+    for i in range(0, len(pending), settings.ACTIVITY_BATCH_SIZE):
+        await _flush(pending[i:i + settings.ACTIVITY_BATCH_SIZE])
+    _queue, _task, _inflight = None, None, None
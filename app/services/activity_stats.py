@@ -0,0 +1,167 @@
+import asyncio, datetime
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from db import engine
+from models import Activity, ActivityRollup, JobMark
+from . import state
+
+# Job incremental: pliega las filas nuevas de `activities` en conteos por hora
+# (activity_rollups). El high-water mark (job_marks.last_id) avanza en la misma
+# transacción que los conteos, así cada fila se cuenta exactamente una vez.
+# Solo se toman filas con más de ACTIVITY_ROLLUP_LAG_S de antigüedad: un lote
+# con ids menores que todavía no hizo commit no queda atrás del mark.
+UTC = datetime.timezone.utc
+JOB = "activity_rollup"
+DIMS = ("total", "path", "method", "user", "ip")
+_task: asyncio.Task | None = None
+
+def hour_floor(ts: datetime.datetime) -> datetime.datetime:
+    if ts.tzinfo is None:  # sqlite devuelve datetimes sin zona; se asumen UTC
+        ts = ts.replace(tzinfo=UTC)
+    return ts.astimezone(UTC).replace(minute=0, second=0, microsecond=0)
+
+def _aggregate(rows) -> Counter:
+    counts: Counter = Counter()
+    for ts, path, method, user_id, ip in rows:
+        if ts is None:  # filas de una tabla `activities` previa sin ts
+            continue
+        h = hour_floor(ts)
+        counts[("total", h, "")] += 1
+        counts[("path", h, (path or "")[:512])] += 1
+        counts[("method", h, method or "")] += 1
+        if user_id is not None:
+            counts[("user", h, str(user_id))] += 1
+        if ip:
+            counts[("ip", h, ip)] += 1
+    return counts
+
+def _upsert(conn: Connection, counts: Counter) -> None:
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(ActivityRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["dim", "hour", "key"],
+        set_={"count": ActivityRollup.count + stmt.excluded["count"]},
+    )
+    conn.execute(stmt, [{"dim": d, "hour": h, "key": k, "count": n} for (d, h, k), n in counts.items()])
+
+def _mark(conn: Connection) -> int:
+    last = conn.execute(select(JobMark.last_id).where(JobMark.name == JOB)).scalar()
+    if last is None:
+        conn.execute(JobMark.__table__.insert().values(name=JOB, last_id=0))
+        return 0
+    return last
+
+def run_once(now: datetime.datetime | None = None) -> int:
+    """Procesa un tramo de filas nuevas. Devuelve cuántas filas plegó."""
+    now = now or datetime.datetime.now(UTC)
+    with engine.begin() as conn:
+        last = _mark(conn)
+        # los próximos CHUNK ids existentes, no la ventana (last, last + CHUNK]: los
+        # huecos (lotes fallidos, retención, caché de la secuencia) no frenan el job
+        chunk = (
+            select(Activity.id).where(
+                Activity.id > last,
+                Activity.ts < now - datetime.timedelta(seconds=settings.ACTIVITY_ROLLUP_LAG_S),
+            ).order_by(Activity.id).limit(settings.ACTIVITY_ROLLUP_CHUNK).subquery()
+        )
+        upto = conn.execute(select(func.max(chunk.c.id))).scalar()
+        if upto is None:
+            return 0
+        rows = conn.execute(
+            select(Activity.ts, Activity.path, Activity.method, Activity.user_id, Activity.remote_ip)
+            .where(Activity.id > last, Activity.id <= upto)
+        ).all()
+        counts = _aggregate(rows)
+        if counts:
+            _upsert(conn, counts)
+        conn.execute(JobMark.__table__.update().where(JobMark.name == JOB).values(last_id=upto, updated_at=now))
+        return len(rows)
+
+def catch_up(now: datetime.datetime | None = None) -> int:
+    total = 0
+    while True:
+        n = run_once(now)
+        total += n
+        if n == 0:
+            return total
+
+def _retention(now: datetime.datetime) -> None:
+    cutoff = now - datetime.timedelta(days=settings.ACTIVITY_ROLLUP_RETENTION_D)
+    with engine.begin() as conn:
+        conn.execute(delete(ActivityRollup).where(ActivityRollup.hour < cutoff))
+
+def maintain() -> None:
+    now = datetime.datetime.now(UTC)
+    catch_up(now)
+    _retention(now)
+
+async def _loop() -> None:
+    while True:
+        await asyncio.sleep(settings.ACTIVITY_ROLLUP_EVERY_S)
+        if not state.leader:
+            continue
+        try:
+            await asyncio.to_thread(maintain)
+        except Exception as ex:
+            print(f"[WARN] Falló el rollup de la bitácora: {ex}")
+
+async def start() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_loop())
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+# ---- consultas (solo sobre activity_rollups)
+def _epoch(dt: datetime.datetime) -> float:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.timestamp()
+
+async def stats(db: AsyncSession, start: datetime.datetime, end: datetime.datetime,
+                dim: str, limit: int) -> Dict[str, Any]:
+    in_range = (ActivityRollup.hour >= start, ActivityRollup.hour < end)
+    series = (await db.execute(
+        select(ActivityRollup.hour, ActivityRollup.count)
+        .where(ActivityRollup.dim == "total", *in_range).order_by(ActivityRollup.hour)
+    )).all()
+    clients_per_hour = dict((await db.execute(
+        select(ActivityRollup.hour, func.count())
+        .where(ActivityRollup.dim == "ip", *in_range).group_by(ActivityRollup.hour)
+    )).all())
+    distinct_clients = await db.scalar(
+        select(func.count(func.distinct(ActivityRollup.key))).where(ActivityRollup.dim == "ip", *in_range)
+    )
+    top: List[Tuple[str, int]] = []
+    if dim != "total":
+        top = (await db.execute(
+            select(ActivityRollup.key, func.sum(ActivityRollup.count).label("n"))
+            .where(ActivityRollup.dim == dim, *in_range)
+            .group_by(ActivityRollup.key).order_by(func.sum(ActivityRollup.count).desc()).limit(limit)
+        )).all()
+    mark = await db.execute(select(JobMark.last_id, JobMark.updated_at).where(JobMark.name == JOB))
+    mark = mark.first()
+    return {
+        "requests": sum(n for _, n in series),
+        "distinct_clients": distinct_clients or 0,
+        "series": [
+            {"hour": _epoch(h), "requests": n, "clients": clients_per_hour.get(h, 0)} for h, n in series
+        ],
+        "top": [{"key": k, "count": int(n)} for k, n in top],
+        "rolled_up_to_id": mark.last_id if mark else 0,
+        "rolled_up_at": _epoch(mark.updated_at) if mark and mark.updated_at else None,
+    }
@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from config import settings
+from . import metrics
+
+# Control de admisión por clase de ruta. Cada clase tiene su propio cupo de
+# requests en curso; al llenarse se rechaza en el acto (503) en vez de encolar,
+# así un pico de logins con bcrypt no deja sin respuesta a /health ni /metrics.
+# "critical" no tiene cupo. Las rutas de auth además llevan un token bucket
+# por IP (429).
+CRITICAL = "critical"
+
+_EXACT = {
+    "/health": CRITICAL,
+    "/metrics": CRITICAL,
+    "/status/stream": "stream",
+    "/status": "monitor",
+    "/history": "monitor",
+    "/teams": "monitor",
+    "/diag": "monitor",
+    "/api/login": "auth",
+    "/api/register": "auth",
+}
+_PREFIXES = (
+    ("/api/", "api"),
+    ("/static/", "static"),
+    ("/assets/", "static"),
+)
+RATE_LIMITED = {"auth"}
+
+def parse_limits(raw: str) -> Dict[str, int]:
+    out = {}
+    for item in raw.split(","):
+        if "=" in item:
+            k, v = item.split("=", 1)
+            out[k.strip()] = int(v)
+    return out
+
+limits = parse_limits(settings.ADMIT_LIMITS)
+inflight: Dict[str, int] = {k: 0 for k in limits}
+
+m_shed = metrics.Counter("http_shed_total", "Requests rechazados por control de admisión", ("class", "reason"))
+metrics.CallbackGauge("http_inflight", "Requests en curso por clase de admisión",
+                      lambda: [((k,), v) for k, v in inflight.items()], ("class",))
+
+def classify(path: str) -> str:
+    cls = _EXACT.get(path)
+    if cls is not None:
+        return cls
+    for prefix, cls in _PREFIXES:
+        if path.startswith(prefix):
+            return cls
+    return "pages"
+
+def try_acquire(cls: str) -> bool:
+    limit = limits.get(cls)
+    if limit is None:  # sin cupo configurado (critical)
+        return True
+    if inflight[cls] >= limit:
+        m_shed.inc((cls, "concurrency"))
+        return False
+    inflight[cls] += 1
+    return True
+
+def release(cls: str) -> None:
+    if cls in inflight:
+        inflight[cls] -= 1
+
+# ---- token bucket por IP (solo el loop de asyncio lo toca: sin locks)
+_buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # ip -> (tokens, última recarga)
+
+def take_token(ip: str) -> float:
+    """0 si se admite; si no, segundos hasta el próximo token."""
+    rate, burst = settings.AUTH_RATE_PER_S, settings.AUTH_RATE_BURST
+    now = time.monotonic()
+    tokens, last = _buckets.pop(ip, (burst, now))
+    tokens = min(burst, tokens + (now - last) * rate)
+    if tokens < 1.0:
+        _buckets[ip] = (tokens, now)
+        m_shed.inc(("auth", "rate"))
+        return (1.0 - tokens) / rate if rate > 0 else float(settings.HASH_RETRY_AFTER_S)
+    _buckets[ip] = (tokens - 1.0, now)
+    # las IPs más viejas salen primero; un bucket olvidado equivale a uno lleno
+    while len(_buckets) > settings.AUTH_RATE_MAX_CLIENTS:
+        _buckets.popitem(last=False)
+    return 0.0
@@ -0,0 +1,103 @@
+import hashlib, json, mimetypes, os, re
+from pathlib import Path
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from config import settings
+from services.http_cache import available_encodings, compress, negotiate
+
+# Pipeline de estáticos: copia cada archivo de static/ a ASSET_DIR con el hash
+# del contenido en el nombre (style.css -> style.<hash>.css), escribe hermanos
+# .gz/.br para los de texto y guarda un manifest que usa pages.py. Los nombres
+# con hash se sirven con Cache-Control immutable.
+TEXT_EXT = {".css", ".js", ".mjs", ".html", ".svg", ".json", ".txt", ".map", ".webmanifest"}
+SIBLING_EXT = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+_HASHED = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")  # nombre.<hash>.ext (incluye builds de Angular)
+
+_manifest: Dict[str, str] = {}
+
+def _write_if_changed(path: Path, data: bytes) -> None:
+    if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return
+    # build() corre en cada worker de uvicorn: un temporal por proceso
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def _precompress(path: Path, data: bytes) -> None:
+    for enc in available_encodings():
+        packed = compress(data, enc)
+        if len(packed) < len(data):
+            _write_if_changed(path.with_name(path.name + SIBLING_EXT[enc]), packed)
+
+def precompress_tree(root: Path) -> None:
+    """Escribe .gz/.br junto a cada archivo de texto bajo root (p. ej. static/ui)."""
+    if not root.is_dir():
+        return
+    for path in root.rglob("*"):
+        if path.is_file() and path.suffix in TEXT_EXT:
+            _precompress(path, path.read_bytes())
+
+def build(src: Path | None = None, out: Path | None = None) -> Dict[str, str]:
+    global _manifest
+    src = src or settings.STATIC_DIR
+    out = out or settings.ASSET_DIR
+    out.mkdir(parents=True, exist_ok=True)
+    manifest: Dict[str, str] = {}
+    for path in sorted(src.iterdir()):
+        if not path.is_file() or path.name.startswith("."):
+            continue
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        hashed = f"{path.stem}.{digest}{path.suffix}"
+        _write_if_changed(out / hashed, data)
+        if path.suffix in TEXT_EXT:
+            _precompress(out / hashed, data)
+        manifest[path.name] = hashed
+    _write_if_changed(out / "manifest.json", json.dumps(manifest, indent=2, sort_keys=True).encode())
+    precompress_tree(src / "ui")
+    _manifest = manifest
+    return manifest
+
+def load_manifest() -> Dict[str, str]:
+    global _manifest
+    try:
+        _manifest = json.loads((settings.ASSET_DIR / "manifest.json").read_text())
+    except (OSError, ValueError):
+        _manifest = {}
+    return _manifest
+
+def asset_url(name: str) -> str:
+    hashed = _manifest.get(name)
+    return f"/assets/{hashed}" if hashed else f"/static/{name}"
+
+class AssetFiles(StaticFiles):
+    """StaticFiles que sirve hermanos precomprimidos y cache immutable para nombres con hash."""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        accept = request_headers.get("accept-encoding", "")
+        response = None
+        for enc in ("br", "gzip"):
+            sibling = str(full_path) + SIBLING_EXT[enc]
+            if negotiate(accept, (enc,)) == enc and os.path.isfile(sibling):
+                media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+                # con stat_result el ETag (propio de la variante) queda listo para el 304
+                response = FileResponse(sibling, status_code=status_code, media_type=media_type,
+                                        headers={"Content-Encoding": enc}, stat_result=os.stat(sibling))
+                if self.is_not_modified(response.headers, request_headers):
+                    response = NotModifiedResponse(response.headers)
+                break
+        if response is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE if _HASHED.search(str(full_path)) else "no-cache"
+        return response
+
+if __name__ == "__main__":
+    # uso en build: python -m services.assets
+    print(json.dumps(build(), indent=2))
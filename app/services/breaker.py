@@ -0,0 +1,76 @@
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+from config import settings
+from . import state
+
+# Estado del circuit breaker por equipo:
+#   closed    -> se sondea normal
+#   open      -> no se sondea hasta open_until; se reporta "down (cached)"
+#   half-open -> venció el backoff: un solo sondeo decide si cierra o reabre
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+# cada cuántas muestras nuevas se recalcula el p99 de un equipo, y cuántas
+# lecturas UP hacen falta para confiar en él (antes se usa el timeout máximo)
+_P99_EVERY = 10
+_P99_MIN_SAMPLES = 5
+
+@dataclass
+class TeamBreaker:
+    failures: int = 0
+    opened: int = 0           # veces seguidas que se abrió (exponente del backoff)
+    open_until: float = 0.0
+    probes: int = 0
+    timeout_s: float | None = None
+    timeout_at: int = 0       # valor de probes cuando se calculó timeout_s
+
+    @property
+    def status(self) -> str:
+        if self.open_until == 0.0:
+            return CLOSED
+        return OPEN if time.monotonic() < self.open_until else HALF_OPEN
+
+_breakers: Dict[str, TeamBreaker] = {}
+
+def get(name: str) -> TeamBreaker:
+    b = _breakers.get(name)
+    if b is None:
+        b = _breakers[name] = TeamBreaker()
+    return b
+
+def forget(name: str) -> None:
+    _breakers.pop(name, None)
+
+def allow(name: str) -> bool:
+    """False mientras el circuito del equipo está abierto."""
+    return get(name).status != OPEN
+
+def record(name: str, ok: bool) -> None:
+    b = get(name)
+    b.probes += 1
+    if ok:
+        b.failures, b.opened, b.open_until = 0, 0, 0.0
+        return
+    b.failures += 1
+    if b.status == HALF_OPEN or b.failures >= settings.PROBE_BREAKER_FAILURES:
+        backoff = min(settings.PROBE_BACKOFF_BASE_S * (2 ** b.opened), settings.PROBE_BACKOFF_MAX_S)
+        b.opened += 1
+        b.open_until = time.monotonic() + backoff
+
+def timeout_for(name: str) -> float:
+    """Timeout de sondeo: p99 reciente * K, entre PROBE_TIMEOUT_MIN_S y PROBE_TIMEOUT_MAX_S.
+
+    Sin latencias UP en la ventana se usa el máximo.
+    """
+    b = get(name)
+    if b.timeout_s is None or b.probes - b.timeout_at >= _P99_EVERY or b.probes <= _P99_EVERY:
+        buf = state.history.get(name)
+        p99 = buf.latency_quantile(0.99, _P99_MIN_SAMPLES) if buf else None
+        if p99 is None:
+            b.timeout_s = settings.PROBE_TIMEOUT_MAX_S
+        else:
+            b.timeout_s = min(max(p99 / 1000.0 * settings.PROBE_TIMEOUT_K, settings.PROBE_TIMEOUT_MIN_S),
+                              settings.PROBE_TIMEOUT_MAX_S)
+        b.timeout_at = b.probes
+    return b.timeout_s
@@ -0,0 +1,40 @@
+import asyncio
+from typing import Any, Set
+
+from . import fastjson
+
+# Difusor en proceso para /status/stream: cada evento se serializa una sola vez
+# y se reparte a la cola de cada suscriptor. Un suscriptor que no consume a
+# tiempo se descarta (el navegador reconecta y recibe un snapshot nuevo).
+QUEUE_MAX = 256
+_subscribers: Set[asyncio.Queue] = set()
+
+def encode(event: str, payload: Any) -> bytes:
+    return encode_raw(event, fastjson.dumps(payload))
+
+def encode_raw(event: str, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+def subscribe() -> asyncio.Queue:
+    q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_MAX)
+    _subscribers.add(q)
+    return q
+
+def unsubscribe(q: asyncio.Queue) -> None:
+    _subscribers.discard(q)
+
+def is_subscribed(q: asyncio.Queue) -> bool:
+    return q in _subscribers
+
+def subscriber_count() -> int:
+    return len(_subscribers)
+
+def publish(event: str, payload: Any) -> None:
+    if not _subscribers:
+        return
+    data = encode(event, payload)
+    for q in list(_subscribers):
+        try:
+            q.put_nowait(data)
+        except asyncio.QueueFull:
+            _subscribers.discard(q)
@@ -0,0 +1,325 @@
+import asyncio, fcntl, os, pickle, stat, struct, time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from config import settings
+from . import state, monitor, metrics, ring
+
+# Modo SHARED_STATE (uvicorn --workers N en un mismo host):
+# - el worker que toma el flock de leader.lock corre el scheduler de sondeos y
+#   publica en SHARED_STATE_DIR:
+#     state.bin      estado completo (checkpoint de generación `gen`), cada
+#                    SHARED_STATE_CHECKPOINT_S: se copia en el loop por tandas y
+#                    se escribe en un thread (temporal + rename). Cabecera en
+#                    pickle y después los arrays de cada ring en crudo: write y
+#                    readinto sueltan el GIL, un pickle.dumps de todo no;
+#     journal.<gen>  cada SHARED_STATE_SYNC_S, solo lo nuevo desde la última
+#                    publicación: muestras agregadas, entradas del snapshot que
+#                    cambiaron, últimos errores y series de monitor.LEADER_METRICS
+#                    que se movieron. Registros con prefijo de largo.
+# - los demás cargan el checkpoint cuando cambia y van aplicando el journal de
+#   su generación desde el offset donde quedaron. Una muestra con ts no mayor
+#   al de la última del ring ya estaba: checkpoint y journal pueden solaparse.
+# - todos intentan tomar el lock en cada vuelta: si el líder muere el kernel
+#   libera el flock y otro worker lo reemplaza desde lo último publicado.
+# Se cargan pickles de ese directorio: tiene que ser propio y 0700.
+_FRAME = struct.Struct(">I")
+
+_lock_fd: int | None = None
+_task: asyncio.Task | None = None
+
+# líder
+_gen = 0
+_journal_fd: int | None = None
+_cursor: Dict[str, float] = {}        # equipo -> ts de la última muestra publicada
+_pub_snap: Dict[str, Dict[str, Any]] = {}
+_pub_names: Tuple[str, ...] = ()
+_pub_errors: Dict[str, str] = {}
+_checkpoint_at = 0.0                  # time.monotonic() del último checkpoint
+
+# seguidores
+_loaded_mtime = 0
+_loaded_gen = 0
+_offset = 0
+
+metrics.CallbackGauge("cluster_leader", "1 si este worker es el líder que corre los sondeos",
+                      lambda: [((), 1 if state.leader else 0)])
+
+def _path(name: str):
+    return settings.SHARED_STATE_DIR / name
+
+def _journal_path(gen: int):
+    return _path(f"journal.{gen}")
+
+def _prepare_dir() -> None:
+    d = settings.SHARED_STATE_DIR
+    d.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = os.lstat(d)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise RuntimeError(f"SHARED_STATE_DIR {d} debe ser un directorio propio (no un symlink ni de otro usuario)")
+    if st.st_mode & 0o077:
+        os.chmod(d, 0o700)  # p. ej. creado por una versión anterior con 0755
+
+def _try_lock() -> bool:
+    global _lock_fd
+    fd = os.open(_path("leader.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    _lock_fd = fd
+    return True
+
+def _release() -> None:
+    global _lock_fd, _journal_fd
+    if _journal_fd is not None:
+        os.close(_journal_fd)
+        _journal_fd = None
+    if _lock_fd is not None:
+        os.close(_lock_fd)  # cerrar el fd suelta el flock
+        _lock_fd = None
+
+# ---- líder
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _private(path: str, flags: int) -> int:
+    return os.open(path, flags, 0o600)
+
+def _write_checkpoint(head: Dict[str, Any], history: Dict[str, ring.ProbeRing]) -> None:
+    head = dict(head, rings=[(name, buf.meta()) for name, buf in history.items()])
+    data = pickle.dumps(head, protocol=pickle.HIGHEST_PROTOCOL)
+    path = _path("state.bin")
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb", opener=_private) as fh:
+        fh.write(_FRAME.pack(len(data)) + data)
+        for buf in history.values():
+            for arr in buf.arrays():
+                fh.write(arr)
+    os.replace(tmp, path)
+    # los seguidores pueden estar terminando de leer la generación anterior
+    try:
+        os.unlink(_journal_path(head["gen"] - 2))
+    except FileNotFoundError:
+        pass
+
+async def _checkpoint() -> None:
+    global _gen, _journal_fd, _pub_snap, _pub_names, _pub_errors, _checkpoint_at
+    _checkpoint_at = time.monotonic()
+    gen = _gen + 1
+    # el corte (snapshot, errores, journal nuevo) se toma de una vez en el loop;
+    # lo que cambie después sale en el journal de la nueva generación
+    snap = dict(state.snapshot)
+    last_error = dict(state.last_error)
+    for fam in monitor.LEADER_METRICS:
+        fam.changes()  # el checkpoint lleva las series completas
+    series = {fam.name: fam.dump() for fam in monitor.LEADER_METRICS}
+    fd = os.open(_journal_path(gen), os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o600)
+    if _journal_fd is not None:
+        os.close(_journal_fd)
+    _gen, _journal_fd = gen, fd
+    _pub_snap, _pub_names, _pub_errors = snap, tuple(snap), last_error
+    # copia de los rings por tandas para no frenar el loop con ventanas grandes;
+    # el cursor de cada equipo queda en su última muestra copiada
+    history: Dict[str, ring.ProbeRing] = {}
+    for i, (name, buf) in enumerate(list(state.history.items())):
+        history[name] = buf.copy()
+        if len(buf):
+            _cursor[name] = buf.ts_at(len(buf) - 1)
+        else:
+            _cursor.pop(name, None)
+        if i % 32 == 31:
+            await asyncio.sleep(0)
+    head = {
+        "gen": gen,
+        "ts": state.snapshot_ts,
+        "snapshot": snap,
+        "last_error": last_error,
+        "errors": list(ring._errs),  # los ProbeRing guardan ids de esta tabla
+        "metrics": series,
+    }
+    await asyncio.to_thread(_write_checkpoint, head, history)
+
+def _collect() -> Dict[str, Any] | None:
+    """Lo nuevo desde la última publicación (en el loop: son pocas muestras)."""
+    global _pub_snap, _pub_names
+    samples: Dict[str, Dict[str, List[Any]]] = {}
+    for name, buf in state.history.items():
+        ks = buf.window(since=_cursor.get(name))
+        if len(ks):
+            cols = buf.columns(ks)
+            samples[name] = cols
+            _cursor[name] = cols["ts"][-1]
+    snap = state.snapshot
+    changed = {n: r for n, r in snap.items() if _pub_snap.get(n) is not r}
+    names = tuple(snap)
+    errors = {n: e for n, e in state.last_error.items() if _pub_errors.get(n) != e}
+    series = {fam.name: ch for fam in monitor.LEADER_METRICS if (ch := fam.changes())}
+    if not samples and not changed and not errors and not series and names == _pub_names:
+        return None
+    record = {
+        "ts": state.snapshot_ts,
+        "samples": samples,
+        "snapshot": changed,
+        "names": names if names != _pub_names else None,
+        "last_error": errors,
+        "metrics": series,
+    }
+    _pub_snap, _pub_names = dict(snap), names
+    _pub_errors.update(errors)
+    return record
+
+async def publish() -> None:
+    if _journal_fd is None or time.monotonic() - _checkpoint_at >= settings.SHARED_STATE_CHECKPOINT_S:
+        await _checkpoint()
+    record = _collect()
+    if record is None:
+        return
+    data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    await asyncio.to_thread(_write_all, _journal_fd, _FRAME.pack(len(data)) + data)
+
+# ---- seguidores
+def _read_checkpoint() -> Tuple[int, Dict[str, Any]] | None:
+    path = _path("state.bin")
+    try:
+        mtime = path.stat().st_mtime_ns
+        if mtime == _loaded_mtime:
+            return None
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with fh:
+        (n,) = _FRAME.unpack(fh.read(_FRAME.size))
+        payload = pickle.loads(fh.read(n))
+        history = {}
+        for name, meta in payload.pop("rings"):
+            buf = ring.ProbeRing.restore(meta)
+            for arr in buf.arrays():
+                view = memoryview(arr).cast("B")
+                if fh.readinto(view) != len(view):
+                    raise ValueError(f"checkpoint truncado en {name}")
+            history[name] = buf
+    payload["history"] = history
+    return mtime, payload
+
+def _read_journal(gen: int, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+    try:
+        with open(_journal_path(gen), "rb") as fh:
+            fh.seek(offset)
+            data = fh.read()
+    except FileNotFoundError:
+        return [], offset
+    records, pos = [], 0
+    # solo registros completos: el último puede estar a medio escribir
+    while pos + _FRAME.size <= len(data):
+        (n,) = _FRAME.unpack_from(data, pos)
+        end = pos + _FRAME.size + n
+        if end > len(data):
+            break
+        records.append(pickle.loads(data[pos + _FRAME.size:end]))
+        pos = end
+    return records, offset + pos
+
+def _apply_checkpoint(payload: Dict[str, Any]) -> None:
+    ring._errs[:] = payload["errors"]
+    ring._err_ids.clear()
+    ring._err_ids.update({e: i for i, e in enumerate(ring._errs) if e})
+    state.history = defaultdict(lambda: ring.ProbeRing(state.HISTORY_WINDOW), payload["history"])
+    state.last_error = payload["last_error"]
+    _apply_metrics(payload.get("metrics", {}), replace=True)
+
+def _apply_metrics(series: Dict[str, Dict[Any, Any]], replace: bool = False) -> None:
+    families = {fam.name: fam for fam in monitor.LEADER_METRICS}
+    for name, changes in series.items():
+        if name in families:
+            families[name].apply(changes, replace)
+
+def _apply_samples(record: Dict[str, Any]) -> None:
+    for name, cols in record["samples"].items():
+        buf = state.history[name]
+        last = buf.ts_at(len(buf) - 1) if len(buf) else float("-inf")
+        for ts, up, lat, err in zip(cols["ts"], cols["up"], cols["lat"], cols["err"]):
+            if ts > last:
+                buf.append(ts, up, lat, err)
+    state.last_error.update(record["last_error"])
+    _apply_metrics(record.get("metrics", {}))
+
+async def _load() -> bool:
+    """Aplica lo que publicó el líder desde la última vez. True si hubo algo."""
+    global _loaded_mtime, _loaded_gen, _offset
+    snap, ts, changed = None, None, False
+    loaded = await asyncio.to_thread(_read_checkpoint)
+    if loaded is not None:
+        _loaded_mtime, payload = loaded
+        _loaded_gen, _offset = payload["gen"], 0
+        _apply_checkpoint(payload)
+        snap, ts, changed = payload["snapshot"], payload["ts"], True
+    if _loaded_gen:
+        records, _offset = await asyncio.to_thread(_read_journal, _loaded_gen, _offset)
+        for record in records:
+            _apply_samples(record)
+            base = snap if snap is not None else state.snapshot
+            names = record["names"] if record["names"] is not None else tuple(base)
+            # las entradas sin cambios conservan su objeto (caché de fragmentos de /status)
+            snap = {n: record["snapshot"].get(n) or base[n] for n in names if n in base or n in record["snapshot"]}
+            ts, changed = record["ts"], True
+    if snap is not None:
+        monitor.apply_snapshot(snap, ts)
+    return changed
+
+def _become_leader() -> None:
+    global _gen
+    state.leader = True
+    _gen = _loaded_gen  # el primer checkpoint abre la generación siguiente
+    for fam in monitor.LEADER_METRICS:
+        fam.track()
+    monitor.start_scheduler(settings.PROBE_INTERVAL_S)
+
+async def _loop() -> None:
+    while True:
+        await asyncio.sleep(settings.SHARED_STATE_SYNC_S)
+        try:
+            if state.leader:
+                await publish()
+                continue
+            if _try_lock():
+                await _load()  # retomar desde lo último que publicó el líder anterior
+                _become_leader()
+            else:
+                await _load()
+        except Exception as ex:
+            print(f"[WARN] Sincronización de estado compartido falló: {ex}")
+
+async def _load_safe() -> None:
+    try:
+        await _load()
+    except Exception as ex:
+        print(f"[WARN] No se pudo leer el estado compartido: {ex}")
+
+async def start() -> None:
+    global _task
+    _prepare_dir()
+    if _try_lock():
+        await _load_safe()
+        _become_leader()
+    else:
+        state.leader = False
+        await _load_safe()
+    if _task is None:
+        _task = asyncio.create_task(_loop())
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    if state.leader:
+        try:
+            await publish()
+        except Exception as ex:
+            print(f"[WARN] No se pudo publicar el estado compartido: {ex}")
+    _release()
@@ -0,0 +1,81 @@
+import json
+from typing import Any, Dict, Sequence, Tuple
+
+from fastapi.responses import JSONResponse
+
+from config import settings
+from . import timing
+
+# Serialización JSON rápida (orjson) para las respuestas de la app. Si orjson no
+# está instalado o FAST_JSON=0 se usa el json de la stdlib con el mismo formato.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+ENABLED = settings.FAST_JSON and orjson is not None
+if settings.FAST_JSON and orjson is None:
+    print("[WARN] FAST_JSON activo pero orjson no está instalado; se usa json de la stdlib")
+
+def dumps(obj: Any) -> bytes:
+    if ENABLED:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada con orjson. Default de la app (ver main.py).
+
+    Las rutas que devuelven la respuesta armada evitan además el paso de
+    jsonable_encoder de FastAPI sobre el dict.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with timing.phase("render"):
+            return dumps(content)
+
+class RawJSONResponse(JSONResponse):
+    """Cuerpo JSON ya codificado (bytes): no se vuelve a serializar."""
+
+    def render(self, content: bytes) -> bytes:
+        return content
+
+# ---- /status: cada resultado de sondeo se codifica una vez y se reutiliza
+# hasta que el scheduler lo reemplaza por otro dict (se compara identidad).
+# Estas cachés solo se tocan desde el loop de asyncio (/status y el broadcaster).
+_fragments: Dict[str, Tuple[Dict[str, Any], bytes]] = {}
+_body_key: Tuple[Any, ...] | None = None
+_body = b""
+
+def _fragment(name: str, r: Dict[str, Any]) -> bytes:
+    cached = _fragments.get(name)
+    if cached is not None and cached[0] is r:
+        return cached[1]
+    data = dumps(r)
+    _fragments[name] = (r, data)
+    return data
+
+def encode_results(snapshot: Dict[str, Dict[str, Any]]) -> bytes:
+    """Arreglo JSON de resultados armado con los fragmentos cacheados."""
+    if len(_fragments) > 2 * len(snapshot) + 16:
+        for name in [n for n in _fragments if n not in snapshot]:
+            del _fragments[name]
+    return b"[" + b",".join(_fragment(n, r) for n, r in snapshot.items()) + b"]"
+
+def encode_page(host: str, snapshot: Dict[str, Dict[str, Any]], names: Sequence[str], ts: int,
+                extra: Dict[str, Any]) -> bytes:
+    """Cuerpo de /status filtrado: `names` elige (y ordena) los resultados."""
+    with timing.phase("render"):
+        results = b",".join(_fragment(n, snapshot[n]) for n in names)
+        tail = dumps(extra)[1:]  # campos extra sin la llave de apertura
+        return (b'{"host":' + dumps(host) + b',"results":[' + results + b'],"ts":' + dumps(ts)
+                + (b"," + tail if len(tail) > 1 else b"}"))
+
+def encode_status(host: str, snapshot: Dict[str, Dict[str, Any]], ts: int, version: Any) -> bytes:
+    """Cuerpo completo de /status; se rearma solo cuando cambia `version`."""
+    global _body_key, _body
+    key = (host, ts, version)
+    if key != _body_key:
+        with timing.phase("render"):
+            _body = b'{"host":' + dumps(host) + b',"results":' + encode_results(snapshot) + b',"ts":' + dumps(ts) + b"}"
+            _body_key = key
+    return _body
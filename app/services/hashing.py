@@ -0,0 +1,85 @@
+import asyncio, multiprocessing, threading, time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+
+import auth
+from config import settings
+from services import metrics, timing
+
+# bcrypt corre en un pool de procesos propio (fuera del GIL y fuera del
+# threadpool de Starlette). La admisión está acotada: si ya hay
+# HASH_QUEUE_MAX operaciones en curso se responde 503 con Retry-After, así una
+# ráfaga de logins no satura el servidor ni frena /teams, /history o /metrics.
+# Los workers salen de un forkserver y no de un fork del proceso de la app: no
+# heredan el loop, los threads ni las conexiones abiertas del pool de la DB.
+_pool: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+_inflight = 0
+
+m_seconds = metrics.Histogram("auth_hash_seconds", "Tiempo de hash/verificación (incluye espera en cola)",
+                              (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+m_rejected = metrics.Counter("auth_hash_rejected_total", "Operaciones de hash rechazadas con 503")
+metrics.CallbackGauge("auth_hash_inflight", "Operaciones de hash en curso o en cola", lambda: [((), _inflight)])
+metrics.CallbackGauge("auth_hash_queue_limit", "Máximo de operaciones de hash admitidas", lambda: [((), settings.HASH_QUEUE_MAX)])
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.HASH_WORKERS,
+                                        mp_context=multiprocessing.get_context("forkserver"))
+        return _pool
+
+def _warm() -> None:
+    # importarlo en el worker ya carga auth y passlib/bcrypt
+    pass
+
+def _admit() -> None:
+    global _inflight
+    with _lock:
+        if _inflight >= settings.HASH_QUEUE_MAX:
+            m_rejected.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servidor ocupado, intenta de nuevo",
+                headers={"Retry-After": str(settings.HASH_RETRY_AFTER_S)},
+            )
+        _inflight += 1
+
+def _release(started: float) -> None:
+    global _inflight
+    with _lock:
+        _inflight -= 1
+    m_seconds.observe(time.perf_counter() - started)
+
+async def _run(fn, *args):
+    _admit()
+    started = time.perf_counter()
+    try:
+        with timing.phase("hash"):
+            return await asyncio.wrap_future(_get_pool().submit(fn, *args))
+    finally:
+        _release(started)
+
+async def hash_password(password: str) -> str:
+    return await _run(auth.hash_password, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run(auth.verify_password, password, hashed)
+
+def queue_depth() -> int:
+    return _inflight
+
+def start() -> None:
+    # arranca los workers ahora y no en el primer login
+    pool = _get_pool()
+    for f in [pool.submit(_warm) for _ in range(settings.HASH_WORKERS)]:
+        f.result()
+
+def stop() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
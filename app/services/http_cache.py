@@ -0,0 +1,74 @@
+import gzip, hashlib
+from typing import Dict, Iterable
+
+from fastapi import Request, Response
+
+try:  # brotli es opcional: sin él solo se ofrecen gzip e identity
+    import brotli
+except ImportError:
+    brotli = None
+
+def available_encodings() -> Iterable[str]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return body
+
+def negotiate(accept_encoding: str, offered: Iterable[str]) -> str:
+    """Elige la codificación preferida (br > gzip) que el cliente acepte con q > 0."""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.lower()] = q
+    for enc in offered:
+        if accepted.get(enc, accepted.get("*", 0.0)) > 0:
+            return enc
+    return "identity"
+
+def etag_matches(if_none_match: str | None, etags: Iterable[str]) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return any(e in tags for e in etags)
+
+class CompiledPage:
+    """Cuerpo fijo renderizado una vez, con variantes comprimidas y ETag fuerte."""
+
+    def __init__(self, body: str | bytes, media_type: str = "text/html; charset=utf-8",
+                 cache_control: str = "no-cache"):
+        raw = body.encode() if isinstance(body, str) else body
+        digest = hashlib.sha256(raw).hexdigest()[:32]
+        self.media_type = media_type
+        self.cache_control = cache_control
+        # cada representación lleva su propio ETag fuerte
+        self.variants: Dict[str, tuple[bytes, str]] = {"identity": (raw, f'"{digest}"')}
+        for enc in available_encodings():
+            data = compress(raw, enc)
+            if len(data) < len(raw):
+                self.variants[enc] = (data, f'"{digest}-{enc}"')
+
+    def response(self, request: Request, status_code: int = 200) -> Response:
+        offered = [e for e in self.variants if e != "identity"]
+        enc = negotiate(request.headers.get("accept-encoding", ""), offered)
+        body, etag = self.variants[enc]
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("if-none-match"), (e for _, e in self.variants.values())):
+            return Response(status_code=304, headers=headers)
+        if enc != "identity":
+            headers["Content-Encoding"] = enc
+        return Response(content=body, status_code=status_code, media_type=self.media_type, headers=headers)
@@ -0,0 +1,212 @@
+import math, threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Set, Tuple
+
+# Exposición Prometheus mínima (sin dependencias). Cada familia guarda su texto
+# ya renderizado y solo lo reconstruye cuando cambió alguno de sus valores, así
+# un scrape solo vuelve a formatear lo que se movió desde el anterior.
+# Con track() una familia además anota qué series cambiaron: changes() las
+# entrega (None = serie borrada) y apply() las carga en otro proceso; así el
+# líder de SHARED_STATE replica en los seguidores las métricas que solo él mide.
+Labels = Tuple[str, ...]
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(v: float) -> str:
+    if isinstance(v, float):
+        if math.isnan(v): return "NaN"
+        if math.isinf(v): return "+Inf" if v > 0 else "-Inf"
+        if v.is_integer(): return str(int(v))
+    return str(v)
+
+_INF = 'le="+Inf"'
+
+class _Family:
+    type_ = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._text = ""
+        self._changed: Set[Labels] | None = None
+        _families.append(self)
+
+    def _store(self) -> Dict[Labels, Any]:
+        raise NotImplementedError
+
+    def _touch(self, labels: Labels) -> None:
+        self._dirty = True
+        if self._changed is not None:
+            self._changed.add(labels)
+
+    def track(self) -> None:
+        with self._lock:
+            if self._changed is None:
+                self._changed = set()
+
+    def dump(self) -> Dict[Labels, Any]:
+        """Todas las series (copia)."""
+        with self._lock:
+            return {k: list(v) if isinstance(v, list) else v for k, v in self._store().items()}
+
+    def changes(self) -> Dict[Labels, Any]:
+        """Series que cambiaron desde la llamada anterior; None si se borró."""
+        with self._lock:
+            if not self._changed:
+                return {}
+            store = self._store()
+            out = {}
+            for k in self._changed:
+                v = store.get(k)
+                out[k] = list(v) if isinstance(v, list) else v
+            self._changed.clear()
+            return out
+
+    def apply(self, changes: Dict[Labels, Any], replace: bool = False) -> None:
+        with self._lock:
+            store = self._store()
+            if replace:
+                store.clear()
+            for k, v in changes.items():
+                if v is None:
+                    store.pop(k, None)
+                else:
+                    store[k] = v
+            self._dirty = True
+
+    def _labels(self, values: Labels, extra: str = "") -> str:
+        parts = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def _lines(self) -> List[str]:
+        raise NotImplementedError
+
+    def text(self) -> str:
+        with self._lock:
+            if self._dirty:
+                head = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_}"]
+                self._text = "\n".join(head + self._lines()) + "\n"
+                self._dirty = False
+            return self._text
+
+class Counter(_Family):
+    type_ = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {} if self.labelnames else {(): 0}
+
+    def _store(self) -> Dict[Labels, float]:
+        return self._values
+
+    def inc(self, labels: Labels = (), n: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + n
+            self._touch(labels)
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def retain(self, keep: Callable[[Labels], bool]) -> None:
+        with self._lock:
+            for k in [k for k in self._values if not keep(k)]:
+                del self._values[k]
+                self._touch(k)
+
+    def _lines(self) -> List[str]:
+        return [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in self._values.items()]
+
+class Gauge(Counter):
+    type_ = "gauge"
+
+    def set(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            old = self._values.get(labels)
+            # NaN != NaN: se compara a mano para no re-renderizar de más
+            same = old is not None and (old == value or (old != old and value != value))
+            if not same:
+                self._values[labels] = value
+                self._touch(labels)
+
+    def remove(self, labels: Labels) -> None:
+        with self._lock:
+            if self._values.pop(labels, None) is not None:
+                self._touch(labels)
+
+class Histogram(_Family):
+    type_ = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}  # labels -> [conteo por bucket..., +Inf, sum]
+        if not self.labelnames:
+            self._series[()] = [0] * (len(self.buckets) + 1) + [0.0]
+
+    def _store(self) -> Dict[Labels, List[float]]:
+        return self._series
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[bisect_left(self.buckets, value)] += 1
+            s[-1] += value
+            self._touch(labels)
+
+    def remove(self, labels: Labels) -> None:
+        with self._lock:
+            if self._series.pop(labels, None) is not None:
+                self._touch(labels)
+
+    def retain(self, keep: Callable[[Labels], bool]) -> None:
+        with self._lock:
+            for k in [k for k in self._series if not keep(k)]:
+                del self._series[k]
+                self._touch(k)
+
+    def _lines(self) -> List[str]:
+        out = []
+        for labels, s in self._series.items():
+            acc = 0
+            for b, n in zip(self.buckets, s):
+                acc += n
+                le = 'le="%s"' % _fmt(float(b))
+                out.append(f"{self.name}_bucket{self._labels(labels, le)} {acc}")
+            acc += s[len(self.buckets)]
+            out.append(f"{self.name}_bucket{self._labels(labels, _INF)} {acc}")
+            out.append(f"{self.name}_sum{self._labels(labels)} {_fmt(round(s[-1], 6))}")
+            out.append(f"{self.name}_count{self._labels(labels)} {acc}")
+        return out
+
+class CallbackGauge(_Family):
+    """Gauge leído al momento del scrape (valores baratos como tamaños de pool)."""
+    type_ = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Iterable[Tuple[Labels, float]]], labelnames: Sequence[str] = (), type_: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.type_ = type_
+
+    def text(self) -> str:
+        try:
+            lines = [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in self.fn()]
+        except Exception:
+            lines = []
+        head = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_}"]
+        return "\n".join(head + lines) + "\n"
+
+_families: List[_Family] = []
+
+def parse_buckets(raw: str) -> List[float]:
+    return [float(x) for x in raw.split(",") if x.strip()]
+
+def render() -> str:
+    return "".join(f.text() for f in _families)
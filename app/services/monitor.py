@@ -1,73 +1,93 @@
-import json, time, math, asyncio
-from typing import List, Dict, Any
+import time, math, asyncio, random
 import httpx
+from typing import List, Dict, Any
+
+from config import settings
+from . import state, probe_client, probe_store, broadcast, registry, metrics, breaker
+from .registry import Team, TeamRegistry
+
+# ---- métricas por equipo (/metrics)
+m_up = metrics.Gauge("service_up", "1 si el servicio está UP, 0 si DOWN", ("service",))
+m_latency = metrics.Gauge("service_latency_ms", "Latencia de /health en ms (última lectura)", ("service",))
+m_latency_mean = metrics.Gauge("service_latency_mean_ms", "Latencia media de /health en ms dentro de la ventana local", ("service",))
+m_uptime = metrics.Gauge("service_uptime_pct", "Uptime en % dentro de la ventana local", ("service",))
+m_probe_seconds = metrics.Histogram(
+    "service_probe_duration_seconds", "Duración de cada sondeo a /health",
+    metrics.parse_buckets(settings.PROBE_LATENCY_BUCKETS), ("service",),
+)
+m_probes = metrics.Counter("service_probes_total", "Sondeos realizados por resultado", ("service", "result"))
+m_timeout = metrics.Gauge("service_probe_timeout_seconds", "Timeout adaptativo vigente del sondeo", ("service",))
+m_breaker_open = metrics.Gauge("service_breaker_open", "1 si el circuit breaker del equipo está abierto", ("service",))
+# las mide solo el worker que sondea; en SHARED_STATE cluster las replica en los
+# seguidores (las de arriba salen del snapshot en apply_snapshot)
+LEADER_METRICS = (m_probe_seconds, m_probes, m_timeout, m_breaker_open)
+
+def _update_gauges(name: str, up: int, lat: int | None) -> None:
+    key = (name,)
+    buf = state.history.get(name)
+    mean = buf.mean_latency() if buf else None
+    m_up.set(key, up)
+    m_latency.set(key, lat if lat is not None else math.nan)
+    m_latency_mean.set(key, round(mean, 1) if mean is not None else math.nan)
+    m_uptime.set(key, uptime_pct(name))
 
-from . import state
-
-def load_teams(raw: str) -> List[Dict[str, Any]]:
-    try:
-        data = json.loads(raw or "[]")
-        if not isinstance(data, list):
-            raise ValueError("TEAMS_JSON debe ser lista")
-        return data
-    except Exception as e:
-        print(f"[WARN] TEAMS_JSON inválido: {e}")
-        return []
-
-def infer_tag(name: str) -> str:
-    if not name:
-        return "-"
-    n = name.lower()
-    if n.startswith("equipo"): return "PLN"
-    if n.startswith("itm"):    return "ITM"
-    return "General"
+def _update_metrics(name: str, up: int, lat: int | None, cached: bool = False) -> None:
+    key = (name,)
+    _update_gauges(name, up, lat)
+    m_probes.inc((name, "cached" if cached else "up" if up else "down"))
+    m_breaker_open.set(key, 0 if breaker.allow(name) else 1)
+    if lat is not None:
+        m_probe_seconds.observe(lat / 1000.0, key)
 
 def uptime_pct(name: str) -> float:
     buf = state.history.get(name)
     if not buf: return 0.0
-    total = len(buf)
-    if total == 0: return 0.0
-    ups = sum(x["up"] for x in buf)
-    return round(100.0 * ups / total, 1)
+    return buf.uptime_pct()
 
 def last_err(name: str) -> str:
     return state.last_error.get(name, "")
 
-async def _check_one(client: httpx.AsyncClient, team: Dict[str, Any], wg_host: str) -> Dict[str, Any]:
-    name = team.get("name")
-    port = int(team.get("port", 0))
-    internal_url = f"http://{name}:8000/health"  # red interna Docker
-    external_url = f"http://{wg_host}:{port}/" if port else None
-    tag = (team.get("tag") or team.get("course") or team.get("materia") or "").strip() or infer_tag(name)
+def _cached_down(out: Dict[str, Any]) -> Dict[str, Any]:
+    # circuito abierto: no se toca la red, se repite el último error conocido
+    out.update({"status": "down", "http": None, "latency_ms": None, "cached": True,
+                "error": last_err(out["name"]) or "down (cached)"})
+    return out
 
-    started = time.monotonic()
+async def _check_one(team: Team) -> Dict[str, Any]:
+    out = team.meta()
+    name = out["name"]
+    if not breaker.allow(name):
+        return _cached_down(out)
+
+    timeout = breaker.timeout_for(name)
+    m_timeout.set((name,), timeout)
     status_txt, code, err = "down", None, None
-    try:
-        r = await client.get(internal_url, timeout=1.5)
-        code = r.status_code
-        if r.is_success:
-            status_txt = "up"
-    except Exception as ex:
-        err = str(ex)
-    latency_ms = int((time.monotonic() - started) * 1000)
-
-    return {
-        "name": name,
-        "tag": tag,
-        "port": port,
-        "repo": team.get("repo"),
-        "internal_url": internal_url,
-        "external_url": external_url,
-        "status": status_txt,
-        "http": code,
-        "latency_ms": latency_ms,
-        "error": err,
-    }
-
-async def check_all(wg_host: str, teams_json: str) -> List[Dict[str, Any]]:
-    teams = load_teams(teams_json)
-    async with httpx.AsyncClient() as client:
-        return await asyncio.gather(*[_check_one(client, t, wg_host) for t in teams])
+    async with probe_client.slot():
+        started = time.monotonic()
+        try:
+            # pre-chequeo TCP solo si el equipo viene fallando: un RST o un SYN
+            # sin respuesta se resuelve sin esperar el timeout HTTP completo
+            if breaker.get(name).failures:
+                err = await probe_client.tcp_check(name, 8000, min(settings.PROBE_CONNECT_TIMEOUT_S, timeout))
+            if err is None:
+                r = await probe_client.get(name, 8000, "/health", timeout=timeout)
+                code = r.status_code
+                if r.is_success:
+                    status_txt = "up"
+        except httpx.TimeoutException:
+            err = f"timeout ({timeout:.2f}s)"
+        except Exception as ex:
+            err = str(ex) or type(ex).__name__
+        latency_ms = int((time.monotonic() - started) * 1000)
+
+    breaker.record(name, status_txt == "up")
+    out.update({"status": status_txt, "http": code, "latency_ms": latency_ms, "error": err, "cached": False})
+    return out
+
+async def check_all(reg: TeamRegistry | None = None) -> List[Dict[str, Any]]:
+    reg = reg or registry.current()
+    probe_client.reserve(len(reg))
+    return await asyncio.gather(*[_check_one(t) for t in reg])
 
 def update_history(results: List[Dict[str, Any]]) -> None:
     now = state.now_ts()
@@ -76,35 +96,143 @@ def update_history(results: List[Dict[str, Any]]) -> None:
         up = 1 if r.get("status") == "up" else 0
         lat = r.get("latency_ms")
         err = r.get("error")
-        state.history[name].append({"ts": now, "up": up, "lat": lat, "err": err})
+        state.history[name].append(now, up, lat, err)
+        probe_store.record(name, now, up, lat, err)
         if err:
             state.last_error[name] = err
 
-def render_metrics(teams_json: str) -> str:
-    lines = [
-        '# HELP service_up 1 si el servicio está UP, 0 si DOWN',
-        '# TYPE service_up gauge',
-        '# HELP service_latency_ms Latencia de /health en ms (última lectura)',
-        '# TYPE service_latency_ms gauge',
-        '# HELP service_uptime_pct Uptime en % dentro de la ventana local',
-        '# TYPE service_uptime_pct gauge',
-    ]
-
-    teams = load_teams(teams_json)
-    names = [t.get("name") for t in teams if t.get("name")]
-
-    for name in names:
-        buf = state.history.get(name, [])
-        if buf:
-            last = buf[-1]
-            up = last["up"]
-            lat = last["lat"] if last["lat"] is not None else math.nan
-        else:
-            up, lat = 0, math.nan
-        upct = uptime_pct(name)
-        labels = f'service="{name}"'
-        lines.append(f'service_up{{{labels}}} {up}')
-        lines.append(f'service_latency_ms{{{labels}}} {lat}')
-        lines.append(f'service_uptime_pct{{{labels}}} {upct}')
-
-    return "\n".join(lines) + "\n"
+# campos que viajan en los deltas de /status/stream
+LIVE_FIELDS = ("status", "http", "latency_ms", "uptime_pct", "error", "cached")
+
+def record_result(r: Dict[str, Any]) -> None:
+    """Agrega la lectura al historial y publica el resultado en el snapshot."""
+    update_history([r])
+    name = r.get("name") or "unknown"
+    r["uptime_pct"] = uptime_pct(name)
+    le = last_err(name)
+    if le and not r.get("error"):
+        r["error"] = le
+    _update_metrics(name, 1 if r.get("status") == "up" else 0, r.get("latency_ms"), bool(r.get("cached")))
+    prev = state.snapshot.get(name) or {}
+    state.snapshot[name] = r
+    state.snapshot_ts = state.now_ts()
+    state.snapshot_version += 1
+
+    changed = _changes(prev, r)
+    if changed:
+        broadcast.publish("delta", {"ts": int(state.snapshot_ts), "changes": [changed]})
+
+def _changes(prev: Dict[str, Any], r: Dict[str, Any]) -> Dict[str, Any] | None:
+    changed = {k: r.get(k) for k in LIVE_FIELDS if prev.get(k) != r.get(k)}
+    if not changed:
+        return None
+    changed["name"] = r.get("name")
+    return changed
+
+def apply_snapshot(snap: Dict[str, Dict[str, Any]], ts: float) -> None:
+    """Publica un snapshot producido por otro worker (modo SHARED_STATE).
+
+    Actualiza los gauges por equipo y emite a los clientes SSE de este worker
+    los mismos deltas que vería un cliente conectado al líder.
+    """
+    prev_snap = state.snapshot
+    state.snapshot = snap
+    state.snapshot_ts = ts
+    state.snapshot_version += 1
+    changes = []
+    for name, r in snap.items():
+        if r.get("status") != "unknown":
+            _update_gauges(name, 1 if r.get("status") == "up" else 0, r.get("latency_ms"))
+        changed = _changes(prev_snap.get(name) or {}, r)
+        if changed:
+            changes.append(changed)
+    if snap.keys() != prev_snap.keys():
+        broadcast.publish("snapshot", snapshot_event())
+    elif changes:
+        broadcast.publish("delta", {"ts": int(ts), "changes": changes})
+
+# ---- scheduler de sondeos (se lanza en el startup de la app)
+# Una tarea por equipo; cada vuelta vuelve a leer el equipo del registro
+# vigente, así una recarga del roster no interrumpe sondeos en curso.
+_tasks: Dict[str, asyncio.Task] = {}
+_default_interval = 5.0
+_running = False
+
+def _placeholder(team: Team) -> Dict[str, Any]:
+    out = team.meta()
+    out.update({"status": "unknown", "http": None, "latency_ms": None, "error": None, "uptime_pct": None, "cached": False})
+    return out
+
+def _interval(team: Team) -> float:
+    return max(team.interval or _default_interval, 0.5)
+
+async def _probe_loop(name: str) -> None:
+    team = registry.current().get(name)
+    # desfase inicial aleatorio para no disparar todos los equipos a la vez
+    await asyncio.sleep(random.uniform(0, _interval(team)))
+    while True:
+        team = registry.current().get(name)
+        if team is None:
+            break
+        started = time.monotonic()
+        try:
+            res = await _check_one(team)
+            if registry.current().get(name) is not None:
+                record_result(res)
+        except Exception as ex:
+            print(f"[WARN] sondeo de {name} falló: {ex}")
+        await asyncio.sleep(max(0.0, _interval(team) - (time.monotonic() - started)))
+    _tasks.pop(name, None)
+
+def _sync(old: TeamRegistry, new: TeamRegistry) -> None:
+    """Ajusta snapshot y tareas al registro recién publicado."""
+    snap = {}
+    for t in new:
+        prev = state.snapshot.get(t.name)
+        snap[t.name] = {**prev, **t.meta()} if prev else _placeholder(t)
+    state.snapshot = snap  # intercambio atómico: /status nunca ve un snapshot a medias
+    names = {(n,) for n in snap}
+    for fam in (m_up, m_latency, m_latency_mean, m_uptime, m_probe_seconds, m_timeout, m_breaker_open):
+        fam.retain(lambda k: k in names)
+    m_probes.retain(lambda k: k[:1] in names)
+    for t in old:
+        if t.name not in snap:
+            breaker.forget(t.name)
+    for n in snap:
+        if state.history.get(n) is None:
+            m_up.set((n,), 0)
+            m_latency.set((n,), math.nan)
+    state.snapshot_ts = state.now_ts()
+    state.snapshot_version += 1
+    probe_client.reserve(len(new))
+    if not _running:
+        return
+    for t in new:
+        if t.name not in _tasks:
+            _tasks[t.name] = asyncio.create_task(_probe_loop(t.name))
+    broadcast.publish("snapshot", snapshot_event())
+
+def start_scheduler(default_interval: float) -> None:
+    global _running, _default_interval
+    if _running:
+        return
+    _running = True
+    _default_interval = default_interval
+    reg = registry.current()
+    _sync(reg, reg)
+
+async def stop_scheduler() -> None:
+    global _running
+    _running = False
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _tasks.clear()
+
+registry.on_swap(_sync)
+
+def snapshot_event() -> Dict[str, Any]:
+    # el evento "snapshot" solo avisa que cambió el roster: la página pide a
+    # /status la vista que necesita (filtros, orden, página)
+    return {"ts": int(state.snapshot_ts or state.now_ts()), "version": state.snapshot_version}
@@ -0,0 +1,187 @@
+import asyncio, socket, ssl, time
+from collections import OrderedDict
+from typing import Any, Dict, Set, Tuple
+import httpx
+
+from config import settings
+from . import timing
+
+# Clientes HTTP del scheduler de monitor y /diag: uno por equipo. El pool de
+# httpcore recorre todas sus conexiones en cada request, así que un pool único
+# para cientos de equipos vuelve cada sondeo O(equipos); con un pool chico por
+# host el costo es constante y las conexiones keep-alive se siguen reutilizando
+# entre rondas. Se cierran en el shutdown de la app.
+# La LRU tiene lugar para todo el roster (monitor llama a reserve): si fuera
+# más chica, cada ronda desalojaría cada cliente antes de volver a usarlo y todo
+# sondeo pagaría un connect nuevo. PROBE_MAX_KEEPALIVE es el piso.
+# Las conexiones en uso en todo el proceso las acota slot(): cada sondeo o
+# /diag toma un lugar de min(PROBE_CONCURRENCY, PROBE_MAX_CONNECTIONS).
+_clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+_capacity = 0
+_closing: Set[asyncio.Task] = set()  # cierres de clientes desalojados
+_ssl_ctx: ssl.SSLContext | None = None
+_sem: asyncio.Semaphore | None = None
+_dns: Dict[str, Tuple[str, float]] = {}  # host -> (ip, expira_en)
+
+def _build_client() -> httpx.AsyncClient:
+    global _ssl_ctx
+    if _ssl_ctx is None:
+        _ssl_ctx = httpx.create_ssl_context()  # cargar certifi una sola vez
+    limits = httpx.Limits(max_connections=2, max_keepalive_connections=1,
+                          keepalive_expiry=settings.PROBE_KEEPALIVE_EXPIRY_S)
+    return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(1.5, pool=5.0), verify=_ssl_ctx)
+
+def reserve(hosts: int) -> None:
+    """Dimensiona la LRU para `hosts` equipos sondeados por ronda."""
+    global _capacity
+    _capacity = hosts
+
+def _discard(client: httpx.AsyncClient) -> None:
+    task = asyncio.get_running_loop().create_task(client.aclose())
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+def get_client(host: str) -> httpx.AsyncClient:
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = _clients[host] = _build_client()
+        # acota las conexiones keep-alive: se cierra el cliente usado hace más tiempo
+        while len(_clients) > max(settings.PROBE_MAX_KEEPALIVE, _capacity):
+            _, old = _clients.popitem(last=False)
+            _discard(old)
+    _clients.move_to_end(host)
+    return client
+
+def slot() -> asyncio.Semaphore:
+    """Semáforo que acota cuántos sondeos (y conexiones) corren en paralelo."""
+    global _sem
+    if _sem is None:
+        _sem = asyncio.Semaphore(min(settings.PROBE_CONCURRENCY, settings.PROBE_MAX_CONNECTIONS))
+    return _sem
+
+async def resolve(host: str) -> str:
+    cached = _dns.get(host)
+    now = time.monotonic()
+    if cached and cached[1] > now:
+        return cached[0]
+    infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    ip = infos[0][4][0]
+    _dns[host] = (ip, now + settings.PROBE_DNS_TTL_S)
+    return ip
+
+def forget(host: str) -> None:
+    _dns.pop(host, None)
+
+async def tcp_check(host: str, port: int, timeout: float) -> str | None:
+    """Abre y cierra una conexión TCP. None si conecta; si no, "refused" o "connect timeout".
+
+    Distingue en milisegundos un contenedor apagado (RST) de uno que no responde,
+    sin ocupar un slot de conexión del pool HTTP.
+    """
+    ip = await resolve(host)
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except asyncio.TimeoutError:
+        return "connect timeout"
+    except ConnectionRefusedError:
+        forget(host)
+        return "refused"
+    except OSError as ex:
+        forget(host)
+        return ex.strerror or str(ex)
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return None
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+async def diagnose(host: str, port: int, path: str, timeout: float) -> Dict[str, Any]:
+    """Chequeo de /diag desglosado por fase (dns, connect, ttfb, total) en ms.
+
+    No usa la caché de DNS ni el pool: mide la red tal como la vería un
+    cliente nuevo. `failure` es None si respondió 2xx; si no, una de
+    dns | dns_timeout | refused | unreachable | connect_timeout | ttfb_timeout |
+    body_timeout | reset | http | deadline (esta última la pone /diag).
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+    out: Dict[str, Any] = {"name": host, "dns_ms": None, "connect_ms": None, "ttfb_ms": None,
+                           "total_ms": None, "status": None, "ip": None, "failure": None, "error": None}
+
+    def left() -> float:
+        return max(0.0, deadline - loop.time())
+
+    writer = None
+    phase = "dns"
+    try:
+        t0 = loop.time()
+        infos = await asyncio.wait_for(loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), left())
+        ip = out["ip"] = infos[0][4][0]
+        out["dns_ms"] = _ms(loop.time() - t0)
+
+        phase = "connect"
+        t0 = loop.time()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), left())
+        out["connect_ms"] = _ms(loop.time() - t0)
+
+        phase = "ttfb"
+        t0 = loop.time()
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), left())
+        out["ttfb_ms"] = _ms(loop.time() - t0)
+        if not line:
+            raise ConnectionResetError("conexión cerrada sin respuesta")
+        parts = line.split()
+        out["status"] = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+
+        phase = "body"
+        await asyncio.wait_for(reader.read(64 * 1024), left())  # resto de la respuesta (Connection: close)
+        if out["status"] is None or not 200 <= out["status"] < 300:
+            out["failure"], out["error"] = "http", line.decode(errors="replace").strip()
+    except asyncio.TimeoutError:
+        out["failure"] = f"{phase}_timeout"
+        out["error"] = f"timeout en {phase}"
+    except socket.gaierror as ex:
+        out["failure"], out["error"] = "dns", str(ex)
+    except ConnectionRefusedError as ex:
+        out["failure"], out["error"] = "refused", str(ex)
+    except ConnectionResetError as ex:
+        out["failure"], out["error"] = "reset", str(ex)
+    except OSError as ex:
+        out["failure"] = "unreachable" if phase == "connect" else "reset"
+        out["error"] = ex.strerror or str(ex)
+    finally:
+        if writer is not None:
+            writer.close()
+    out["total_ms"] = _ms(loop.time() - started)
+    return out
+
+async def get(host: str, port: int, path: str, timeout: float) -> httpx.Response:
+    """GET a http://{host}:{port}{path} usando la IP cacheada del host."""
+    ip = await resolve(host)
+    netloc = f"[{ip}]" if ":" in ip else ip
+    try:
+        with timing.phase("probe"):
+            return await get_client(host).get(f"http://{netloc}:{port}{path}", headers={"Host": host}, timeout=timeout)
+    except httpx.ConnectError:
+        # el contenedor pudo reiniciar con otra IP: se vuelve a resolver la próxima vez
+        forget(host)
+        raise
+
+async def start() -> None:
+    global _sem
+    _sem = None
+
+async def close() -> None:
+    global _sem
+    clients = list(_clients.values())
+    _clients.clear()
+    await asyncio.gather(*(c.aclose() for c in clients), *_closing, return_exceptions=True)
+    _sem = None
+    _dns.clear()
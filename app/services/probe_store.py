@@ -0,0 +1,199 @@
+import asyncio, datetime, math
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from db import engine, async_engine
+from models import ProbeSample, ProbeRollup
+from . import registry, state
+
+# Historial persistente de sondeos: las lecturas se acumulan en memoria y se
+# insertan por lotes en probe_samples; un ciclo de mantenimiento las resume en
+# probe_rollups (1m y 1h) y aplica la retención de cada resolución.
+UTC = datetime.timezone.utc
+RESOLUTIONS = {"1m": 60, "1h": 3600}
+_CHUNK_S = 3600  # máximo de muestras crudas (en segundos) leídas por consulta de rollup
+
+_pending: List[Dict[str, Any]] = []
+_task: asyncio.Task | None = None
+_rolled_until: Dict[str, float] = {}  # resolución -> epoch hasta donde ya se resumió
+counters = {"written": 0, "dropped": 0, "failed": 0}
+
+def _dt(ts: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(ts, UTC)
+
+def _epoch(dt: datetime.datetime) -> float:
+    # sqlite devuelve datetimes sin zona; se asumen UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.timestamp()
+
+def record(team: str, ts: float, up: int, lat: int | None, err: str | None) -> None:
+    if len(_pending) >= settings.PROBE_STORE_MAX_PENDING:
+        counters["dropped"] += 1
+        return
+    _pending.append({"team": team, "ts": _dt(ts), "up": up, "latency_ms": lat, "error": err})
+
+async def flush() -> None:
+    global _pending
+    if not _pending:
+        return
+    batch, _pending = _pending, []
+    try:
+        async with async_engine.begin() as conn:
+            await conn.execute(insert(ProbeSample), batch)
+        counters["written"] += len(batch)
+    except Exception as ex:
+        counters["failed"] += len(batch)
+        print(f"[WARN] No se pudo guardar historial de sondeos ({len(batch)} filas): {ex}")
+
+# ---- rollups
+def _p95(sorted_vals: List[int]) -> int:
+    return sorted_vals[max(0, math.ceil(0.95 * len(sorted_vals)) - 1)]
+
+def _aggregate(rows, step: int, resolution: str) -> List[Dict[str, Any]]:
+    groups: Dict[Tuple[str, float], List] = defaultdict(list)
+    for team, ts, up, lat, err in rows:
+        groups[(team, math.floor(_epoch(ts) / step) * step)].append((up, lat, err))
+    out = []
+    for (team, bucket), items in groups.items():
+        lats = sorted(lat for _, lat, _ in items if lat is not None)
+        out.append({
+            "resolution": resolution,
+            "team": team,
+            "bucket": _dt(bucket),
+            "samples": len(items),
+            "ups": sum(up for up, _, _ in items),
+            "errors": sum(1 for _, _, err in items if err),
+            "lat_min": lats[0] if lats else None,
+            "lat_avg": round(sum(lats) / len(lats), 1) if lats else None,
+            "lat_max": lats[-1] if lats else None,
+            "lat_p95": _p95(lats) if lats else None,
+        })
+    return out
+
+def _rollup(resolution: str, now: float) -> int:
+    step = RESOLUTIONS[resolution]
+    # solo intervalos completos, con margen para lecturas aún en _pending
+    end = math.floor((now - 2 * settings.PROBE_STORE_FLUSH_S) / step) * step
+    written = 0
+    with engine.begin() as conn:
+        start = _rolled_until.get(resolution)
+        if start is None:
+            last = conn.execute(select(func.max(ProbeRollup.bucket)).where(ProbeRollup.resolution == resolution)).scalar()
+            if last is not None:
+                start = _epoch(last) + step
+            else:
+                first = conn.execute(select(func.min(ProbeSample.ts))).scalar()
+                if first is None:
+                    return 0
+                start = math.floor(_epoch(first) / step) * step
+        while start < end:
+            chunk_end = min(end, start + max(step, _CHUNK_S))
+            rows = conn.execute(
+                select(ProbeSample.team, ProbeSample.ts, ProbeSample.up, ProbeSample.latency_ms, ProbeSample.error)
+                .where(ProbeSample.ts >= _dt(start), ProbeSample.ts < _dt(chunk_end))
+            ).all()
+            agg = _aggregate(rows, step, resolution)
+            if agg:
+                conn.execute(insert(ProbeRollup), agg)
+                written += len(agg)
+            start = chunk_end
+    _rolled_until[resolution] = max(start, _rolled_until.get(resolution, start))
+    return written
+
+def _retention(now: float) -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(ProbeSample).where(ProbeSample.ts < _dt(now - settings.PROBE_RETENTION_RAW_H * 3600)))
+        for resolution, keep_d in (("1m", settings.PROBE_RETENTION_1M_D), ("1h", settings.PROBE_RETENTION_1H_D)):
+            conn.execute(delete(ProbeRollup).where(
+                ProbeRollup.resolution == resolution,
+                ProbeRollup.bucket < _dt(now - keep_d * 86400),
+            ))
+
+def maintain(now: float) -> None:
+    for resolution in RESOLUTIONS:
+        _rollup(resolution, now)
+    _retention(now)
+
+async def _loop() -> None:
+    loop = asyncio.get_running_loop()
+    last_maint = loop.time()
+    while True:
+        await asyncio.sleep(settings.PROBE_STORE_FLUSH_S)
+        await flush()
+        if state.leader and loop.time() - last_maint >= settings.PROBE_ROLLUP_EVERY_S:
+            last_maint = loop.time()
+            try:
+                await asyncio.to_thread(maintain, datetime.datetime.now(UTC).timestamp())
+            except Exception as ex:
+                print(f"[WARN] Falló el mantenimiento del historial: {ex}")
+
+async def start() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_loop())
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    await flush()
+
+# ---- consultas
+def pick_resolution(start: float, end: float, now: float) -> str:
+    """Resolución más fina que conserva el rango y no pasa de HISTORY_MAX_POINTS puntos."""
+    options = (
+        ("raw", settings.PROBE_INTERVAL_S, settings.PROBE_RETENTION_RAW_H * 3600),
+        ("1m", RESOLUTIONS["1m"], settings.PROBE_RETENTION_1M_D * 86400),
+    )
+    for name, step, keep in options:
+        if start >= now - keep and (end - start) / step <= settings.HISTORY_MAX_POINTS:
+            return name
+    return "1h"
+
+def step_s(resolution: str, team: str | None = None) -> float:
+    """Segundos entre puntos de una serie: el intervalo de sondeo más corto en crudo."""
+    if resolution != "raw":
+        return RESOLUTIONS[resolution]
+    intervals = [t.interval or settings.PROBE_INTERVAL_S for t in registry.current() if team is None or t.name == team]
+    return max(0.5, min(intervals, default=settings.PROBE_INTERVAL_S))
+
+def too_many_points(start: float, end: float, resolution: str, team: str | None = None) -> bool:
+    return (end - start) / step_s(resolution, team) > settings.HISTORY_MAX_POINTS
+
+async def query(db: AsyncSession, team: str | None, start: float, end: float, resolution: str) -> Dict[str, List[Dict[str, Any]]]:
+    out: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    if resolution == "raw":
+        q = select(ProbeSample.team, ProbeSample.ts, ProbeSample.up, ProbeSample.latency_ms, ProbeSample.error) \
+            .where(ProbeSample.ts >= _dt(start), ProbeSample.ts <= _dt(end))
+        if team:
+            q = q.where(ProbeSample.team == team)
+        for name, ts, up, lat, err in await db.execute(q.order_by(ProbeSample.team, ProbeSample.ts)):
+            out[name].append({"ts": _epoch(ts), "up": up, "lat": lat, "err": err})
+        return out
+
+    q = select(ProbeRollup).where(
+        ProbeRollup.resolution == resolution,
+        ProbeRollup.bucket >= _dt(start),
+        ProbeRollup.bucket <= _dt(end),
+    )
+    if team:
+        q = q.where(ProbeRollup.team == team)
+    for r in await db.scalars(q.order_by(ProbeRollup.team, ProbeRollup.bucket)):
+        out[r.team].append({
+            "ts": _epoch(r.bucket),
+            "samples": r.samples,
+            "uptime_pct": round(100.0 * r.ups / r.samples, 1) if r.samples else 0.0,
+            "errors": r.errors,
+            "lat_min": r.lat_min,
+            "lat_avg": r.lat_avg,
+            "lat_max": r.lat_max,
+            "lat_p95": r.lat_p95,
+        })
+    return out
@@ -0,0 +1,116 @@
+import contextvars, re, time
+from collections import Counter, deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from config import settings
+from db import engine, async_engine, on_checkout_wait
+from . import metrics, timing
+
+# Instrumentación de SQLAlchemy: cuántas consultas hace cada request, cuánto
+# tardan, cuánto esperó por una conexión del pool, y qué sentencias son lentas
+# o se repiten (N+1). El middleware de timing abre el alcance por request; los
+# eventos corren en el greenlet/thread de la sesión, que hereda ese contexto.
+class RequestQueries:
+    __slots__ = ("count", "seconds", "wait", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.wait = 0.0
+        self.statements: Counter = Counter()  # SQL normalizado -> veces
+
+_scope: contextvars.ContextVar[RequestQueries | None] = contextvars.ContextVar("request_queries", default=None)
+
+m_per_request = metrics.Histogram("db_queries_per_request", "Consultas SQL por request",
+                                  (0, 1, 2, 3, 5, 10, 20, 50, 100))
+m_query_seconds = metrics.Histogram("db_query_seconds", "Duración de cada sentencia SQL",
+                                    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5), ("engine",))
+m_pool_wait = metrics.Histogram("db_pool_wait_seconds", "Espera por una conexión del pool",
+                                (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5), ("engine",))
+m_slow = metrics.Counter("db_slow_queries_total", "Sentencias SQL sobre DB_SLOW_QUERY_MS", ("engine",))
+m_repeated = metrics.Counter("db_repeated_queries_total", "Requests con una misma sentencia repetida DB_REPEAT_WARN veces o más")
+
+def begin() -> RequestQueries:
+    q = RequestQueries()
+    _scope.set(q)
+    return q
+
+def current() -> RequestQueries | None:
+    return _scope.get()
+
+# ---- SQL normalizado: sin literales ni listas de parámetros, en una línea
+_WS = re.compile(r"\s+")
+_STR = re.compile(r"'(?:[^']|'')*'")
+_NUM = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<![:\w]):\w+|\?")
+# los IN (...) expandidos cambian de largo con cada llamada: se colapsan
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+@lru_cache(maxsize=1024)
+def normalize(sql: str) -> str:
+    s = _WS.sub(" ", sql).strip()
+    s = _STR.sub("?", s)
+    s = _PARAM.sub("?", s)
+    s = _NUM.sub("?", s)
+    return _IN_LIST.sub("(?...)", s)
+
+# ---- sentencias lentas: se imprimen y se guardan las últimas para /api/admin/slow-queries
+slow_queries: Deque[Dict[str, Any]] = deque(maxlen=settings.DB_SLOW_QUERY_KEEP)
+
+def _engine_name(conn) -> str:
+    return "async" if conn.engine is async_engine.sync_engine else "sync"
+
+# el inicio va en el contexto de ejecución y no en una pila en conn.info: si la
+# sentencia falla no hay after_cursor_execute y el contexto se descarta con ella
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    name = _engine_name(conn)
+    timing.add("db", elapsed)
+    m_query_seconds.observe(elapsed, (name,))
+    q = _scope.get()
+    if q is not None:
+        q.count += 1
+        q.seconds += elapsed
+        q.statements[normalize(statement)] += 1
+    if elapsed * 1000 >= settings.DB_SLOW_QUERY_MS:
+        sql = normalize(statement)
+        m_slow.inc((name,))
+        slow_queries.append({"ts": time.time(), "engine": name, "ms": round(elapsed * 1000, 1), "sql": sql})
+        print(f"[WARN] Consulta lenta ({name}) en {elapsed * 1000:.1f}ms: {sql[:300]}")
+
+for _eng in (engine, async_engine.sync_engine):
+    event.listen(_eng, "before_cursor_execute", _before_cursor)
+    event.listen(_eng, "after_cursor_execute", _after_cursor)
+
+def _pool_wait(pool: Pool, seconds: float) -> None:
+    m_pool_wait.observe(seconds, ("async" if isinstance(pool, AsyncAdaptedQueuePool) else "sync",))
+    timing.add("db_wait", seconds)
+    q = _scope.get()
+    if q is not None:
+        q.wait += seconds
+
+on_checkout_wait(_pool_wait)
+
+def finish(q: RequestQueries, method: str, path: str) -> None:
+    """Cierra el alcance del request: métricas y aviso de sentencias repetidas."""
+    m_per_request.observe(q.count)
+    if not q.statements or q.count < settings.DB_REPEAT_WARN:
+        return
+    sql, times = q.statements.most_common(1)[0]
+    if times >= settings.DB_REPEAT_WARN:
+        m_repeated.inc()
+        print(f"[WARN] {method} {path} repitió {times} veces la misma consulta ({q.count} en total): {sql[:300]}")
+
+def recent_slow() -> List[Dict[str, Any]]:
+    return list(slow_queries)
@@ -0,0 +1,188 @@
+import asyncio, json, os, signal
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from config import settings
+
+def infer_tag(name: str) -> str:
+    if not name:
+        return "-"
+    n = name.lower()
+    if n.startswith("equipo"): return "PLN"
+    if n.startswith("itm"):    return "ITM"
+    return "General"
+
+@dataclass(frozen=True)
+class Team:
+    name: str
+    port: int
+    tag: str
+    repo: str | None
+    internal_url: str
+    external_url: str | None
+    interval: float | None
+    raw: Dict[str, Any] = field(compare=False, hash=False)
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "tag": self.tag,
+            "port": self.port,
+            "repo": self.repo,
+            "internal_url": self.internal_url,
+            "external_url": self.external_url,
+        }
+
+def _team_from(entry: Any, wg_host: str) -> Team:
+    if not isinstance(entry, dict):
+        raise ValueError("cada equipo debe ser un objeto")
+    name = entry.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("equipo sin 'name'")
+    name = name.strip()
+    port = int(entry.get("port") or 0)
+    interval = entry.get("interval")
+    interval = float(interval) if interval not in (None, "") else None
+    tag = entry.get("tag") or entry.get("course") or entry.get("materia") or ""
+    if not isinstance(tag, str):
+        raise ValueError(f"'tag' de '{name}' debe ser texto")
+    tag = tag.strip() or infer_tag(name)
+    return Team(
+        name=name,
+        port=port,
+        tag=tag,
+        repo=entry.get("repo"),
+        internal_url=f"http://{name}:8000/health",  # red interna Docker
+        external_url=f"http://{wg_host}:{port}/" if port else None,
+        interval=interval,
+        raw=entry,
+    )
+
+class TeamRegistry:
+    """Roster de equipos parseado una sola vez e indexado por nombre y tag.
+
+    Es inmutable: una recarga construye un registro nuevo y lo publica con
+    un intercambio atómico de la referencia global.
+    """
+
+    def __init__(self, teams: List[Team], errors: List[str] | None = None, source: str = ""):
+        self.teams: Tuple[Team, ...] = tuple(teams)
+        self.errors = errors or []
+        self.source = source
+        self.by_name: Dict[str, Team] = {t.name: t for t in self.teams}
+        by_tag: Dict[str, List[Team]] = {}
+        for t in self.teams:
+            by_tag.setdefault(t.tag, []).append(t)
+        self.by_tag: Dict[str, Tuple[Team, ...]] = {k: tuple(v) for k, v in by_tag.items()}
+
+    @classmethod
+    def parse(cls, raw: str, wg_host: str, source: str = "TEAMS_JSON") -> "TeamRegistry":
+        try:
+            data = json.loads(raw or "[]")
+        except Exception as e:
+            return cls([], [f"{source} inválido: {e}"], source)
+        if not isinstance(data, list):
+            return cls([], [f"{source} debe ser lista"], source)
+        teams, errors, seen = [], [], set()
+        for i, entry in enumerate(data):
+            try:
+                t = _team_from(entry, wg_host)
+            except (TypeError, ValueError) as e:
+                errors.append(f"{source}[{i}]: {e}")
+                continue
+            if t.name in seen:
+                errors.append(f"{source}[{i}]: equipo duplicado '{t.name}'")
+                continue
+            seen.add(t.name)
+            teams.append(t)
+        return cls(teams, errors, source)
+
+    def __iter__(self) -> Iterator[Team]:
+        return iter(self.teams)
+
+    def __len__(self) -> int:
+        return len(self.teams)
+
+    def get(self, name: str) -> Team | None:
+        return self.by_name.get(name)
+
+    def with_tag(self, tag: str) -> Tuple[Team, ...]:
+        return self.by_tag.get(tag, ())
+
+    def names(self) -> List[str]:
+        return [t.name for t in self.teams]
+
+# ---- registro vigente + recarga en caliente
+_current = TeamRegistry([])
+_listeners: List[Callable[[TeamRegistry, TeamRegistry], None]] = []
+_watch_task: asyncio.Task | None = None
+_mtime: float | None = None
+
+def current() -> TeamRegistry:
+    return _current
+
+def on_swap(fn: Callable[[TeamRegistry, TeamRegistry], None]) -> None:
+    _listeners.append(fn)
+
+def _publish(new: TeamRegistry) -> None:
+    global _current
+    old, _current = _current, new
+    for e in new.errors:
+        print(f"[WARN] {e}")
+    for fn in _listeners:
+        fn(old, new)
+
+def _read_source() -> TeamRegistry:
+    path = settings.TEAMS_FILE
+    if path:
+        with open(path, encoding="utf-8") as fh:
+            return TeamRegistry.parse(fh.read(), settings.WG_HOST, source=path)
+    return TeamRegistry.parse(settings.TEAMS_JSON, settings.WG_HOST)
+
+def load() -> TeamRegistry:
+    """(Re)lee el roster (TEAMS_FILE si está definido, si no TEAMS_JSON) y lo publica."""
+    global _mtime
+    try:
+        if settings.TEAMS_FILE:
+            _mtime = os.stat(settings.TEAMS_FILE).st_mtime
+        new = _read_source()
+    except OSError as e:
+        print(f"[WARN] No se pudo leer {settings.TEAMS_FILE}: {e}")
+        return _current
+    # un archivo a medio escribir no debe borrar el roster vigente
+    if not new.teams and new.errors and _current.teams:
+        for e in new.errors:
+            print(f"[WARN] {e} (se conserva el roster anterior)")
+        return _current
+    _publish(new)
+    return new
+
+async def _watch() -> None:
+    while True:
+        await asyncio.sleep(settings.TEAMS_RELOAD_S)
+        try:
+            mtime = os.stat(settings.TEAMS_FILE).st_mtime
+        except OSError:
+            continue
+        if mtime != _mtime:
+            load()
+
+def start_watcher() -> None:
+    global _watch_task
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, load)
+    except (NotImplementedError, RuntimeError, ValueError, AttributeError):
+        pass  # sin señales (Windows / thread secundario)
+    if settings.TEAMS_FILE and _watch_task is None:
+        _watch_task = asyncio.create_task(_watch())
+
+async def stop_watcher() -> None:
+    global _watch_task
+    try:
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+    except (NotImplementedError, RuntimeError, ValueError, AttributeError):
+        pass
+    if _watch_task is not None:
+        _watch_task.cancel()
+        await asyncio.gather(_watch_task, return_exceptions=True)
+        _watch_task = None
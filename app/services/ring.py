@@ -0,0 +1,172 @@
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+FIELDS = ("ts", "up", "lat", "err")  # campos de cada muestra
+
+# Errores internados: el buffer guarda un id pequeño en vez del string.
+# El id 0 representa "sin error".
+_err_ids: Dict[str, int] = {}
+_errs: List[str | None] = [None]
+
+def intern_error(err: str | None) -> int:
+    if not err:
+        return 0
+    i = _err_ids.get(err)
+    if i is None:
+        i = _err_ids[err] = len(_errs)
+        _errs.append(err)
+    return i
+
+def error_text(i: int) -> str | None:
+    return _errs[i]
+
+class ProbeRing:
+    """Buffer circular de sondeos de un equipo sobre arrays tipados.
+
+    Mantiene contadores acumulados para que uptime, latencia media y última
+    lectura salgan en O(1) sin recorrer la ventana.
+    """
+
+    __slots__ = ("maxlen", "ts", "up", "lat", "err", "_head", "_len", "_ups", "_lat_sum", "_lat_n")
+
+    def __init__(self, maxlen: int):
+        self.maxlen = maxlen
+        self.ts = array("d", [0.0]) * maxlen   # float64
+        self.up = array("B", [0]) * maxlen     # uint8
+        self.lat = array("i", [-1]) * maxlen   # int32, -1 = sin dato
+        self.err = array("I", [0]) * maxlen    # id de error internado
+        self._head = 0   # siguiente posición a escribir
+        self._len = 0
+        self._ups = 0
+        self._lat_sum = 0
+        self._lat_n = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    # ---- volcado a disco (modo SHARED_STATE): contadores + arrays crudos
+    def meta(self) -> Tuple[int, int, int, int, int, int]:
+        return (self.maxlen, self._head, self._len, self._ups, self._lat_sum, self._lat_n)
+
+    def arrays(self) -> Tuple[array, array, array, array]:
+        return (self.ts, self.up, self.lat, self.err)
+
+    @classmethod
+    def restore(cls, meta: Tuple[int, int, int, int, int, int]) -> "ProbeRing":
+        """Ring vacío con los contadores de `meta`; falta llenar arrays()."""
+        buf = cls(meta[0])
+        buf._head, buf._len, buf._ups, buf._lat_sum, buf._lat_n = meta[1:]
+        return buf
+
+    def copy(self) -> "ProbeRing":
+        """Copia independiente (para serializarla fuera del loop mientras este sigue escribiendo)."""
+        other = ProbeRing.__new__(ProbeRing)
+        for slot in self.__slots__:
+            value = getattr(self, slot)
+            setattr(other, slot, value[:] if isinstance(value, array) else value)
+        return other
+
+    def append(self, ts: float, up: int, lat: int | None, err: str | None) -> None:
+        i = self._head
+        if self._len == self.maxlen:
+            # se sobreescribe la muestra más vieja: se descuenta de los acumulados
+            self._ups -= self.up[i]
+            if self.lat[i] >= 0:
+                self._lat_sum -= self.lat[i]
+                self._lat_n -= 1
+        else:
+            self._len += 1
+        lat_v = -1 if lat is None else int(lat)
+        self.ts[i] = ts
+        self.up[i] = 1 if up else 0
+        self.lat[i] = lat_v
+        self.err[i] = intern_error(err)
+        self._ups += self.up[i]
+        if lat_v >= 0:
+            self._lat_sum += lat_v
+            self._lat_n += 1
+        self._head = (i + 1) % self.maxlen
+
+    def _index(self, k: int) -> int:
+        # k-ésima muestra desde la más vieja
+        return (self._head - self._len + k) % self.maxlen
+
+    def _sample(self, i: int) -> Dict[str, Any]:
+        lat = self.lat[i]
+        return {"ts": self.ts[i], "up": self.up[i], "lat": lat if lat >= 0 else None, "err": _errs[self.err[i]]}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for k in range(self._len):
+            yield self._sample(self._index(k))
+
+    def first_after(self, since: float) -> int:
+        # búsqueda binaria: los ts están en orden dentro de la ventana
+        lo, hi = 0, self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._index(mid)] <= since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def window(self, since: float | None = None, limit: int | None = None) -> range:
+        """Posiciones (desde la más vieja) de las muestras con ts > since.
+
+        Con since devuelve las primeras `limit` (para avanzar un cursor); sin
+        since, las últimas `limit`.
+        """
+        if since is None:
+            start = 0 if limit is None else max(0, self._len - limit)
+            return range(start, self._len)
+        start = self.first_after(since)
+        end = self._len if limit is None else min(self._len, start + limit)
+        return range(start, end)
+
+    def ts_at(self, k: int) -> float:
+        return self.ts[self._index(k)]
+
+    def rows(self, ks: range, fields: Iterable[str] = FIELDS) -> List[Dict[str, Any]]:
+        out = []
+        for k in ks:
+            sample = self._sample(self._index(k))
+            out.append({f: sample[f] for f in fields})
+        return out
+
+    def columns(self, ks: range, fields: Iterable[str] = FIELDS) -> Dict[str, List[Any]]:
+        """Arrays paralelos por campo: mucho menos JSON que una lista de dicts."""
+        idx = [self._index(k) for k in ks]
+        out: Dict[str, List[Any]] = {}
+        for f in fields:
+            if f == "ts":
+                out[f] = [self.ts[i] for i in idx]
+            elif f == "up":
+                out[f] = [self.up[i] for i in idx]
+            elif f == "lat":
+                out[f] = [self.lat[i] if self.lat[i] >= 0 else None for i in idx]
+            elif f == "err":
+                out[f] = [_errs[self.err[i]] for i in idx]
+        return out
+
+    def last(self) -> Dict[str, Any] | None:
+        if not self._len:
+            return None
+        return self._sample((self._head - 1) % self.maxlen)
+
+    def uptime_pct(self) -> float:
+        if not self._len:
+            return 0.0
+        return round(100.0 * self._ups / self._len, 1)
+
+    def latency_quantile(self, q: float, min_n: int = 1) -> float | None:
+        """Cuantil q de la latencia de los sondeos UP en la ventana (None si hay menos de min_n)."""
+        idx = (self._index(k) for k in range(self._len))
+        vals = sorted(self.lat[i] for i in idx if self.up[i] and self.lat[i] >= 0)
+        if len(vals) < max(min_n, 1):
+            return None
+        return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+    def mean_latency(self) -> float | None:
+        if not self._lat_n:
+            return None
+        return self._lat_sum / self._lat_n
@@ -0,0 +1,316 @@
+import asyncio, datetime, re
+from typing import List, Tuple
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine import Connection
+
+from config import settings
+from db import Base, engine
+from models import Activity
+from . import state
+
+# Bootstrap del esquema (reemplaza el create_all suelto del startup) y
+# mantenimiento de la bitácora:
+# - Postgres: `activities` es una tabla particionada por rango de ts (mes o día),
+#   con particiones creadas por adelantado y una DEFAULT de respaldo. La
+#   retención borra (o separa, para archivar) particiones enteras.
+# - Otros motores (sqlite en desarrollo), o una `activities` simple de una
+#   versión anterior que aún no se migró: tabla simple y retención por DELETE
+#   en lotes.
+# El startup nunca reescribe datos: convertir una tabla existente es una
+# migración explícita (python -m services.schema migrate-activities), igual
+# que pasar a BIGINT los ids de tablas creadas como INTEGER (migrate-bigint-ids).
+UTC = datetime.timezone.utc
+PARENT = "activities"
+_LOCK_KEY = 720250001  # pg_advisory_xact_lock: un solo worker corre el DDL a la vez
+_DELETE_CHUNK = 10_000
+_BIGINT_TABLES = ("probe_samples", "probe_rollups", "activity_rollups")
+_task: asyncio.Task | None = None
+
+def _is_pg(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+# ---- períodos de partición
+def period_start(dt: datetime.datetime) -> datetime.datetime:
+    dt = dt.astimezone(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+    return dt.replace(day=1) if settings.ACTIVITY_PARTITION == "month" else dt
+
+def next_period(start: datetime.datetime) -> datetime.datetime:
+    if settings.ACTIVITY_PARTITION == "month":
+        return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+def partition_name(start: datetime.datetime) -> str:
+    fmt = "%Y%m" if settings.ACTIVITY_PARTITION == "month" else "%Y%m%d"
+    return f"{PARENT}_p{start.strftime(fmt)}"
+
+# ---- Postgres
+_PG_PARENT_DDL = f"""
+CREATE TABLE {PARENT} (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+    user_id INTEGER,
+    path VARCHAR(512),
+    method VARCHAR(16),
+    user_agent TEXT,
+    remote_ip VARCHAR(64),
+    detail TEXT,
+    ts TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, ts)
+) PARTITION BY RANGE (ts)
+"""
+
+def _relkind(conn: Connection, name: str) -> str | None:
+    return conn.execute(text(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = :name AND n.nspname = current_schema()"
+    ), {"name": name}).scalar()
+
+def _pg_migrate_legacy(conn: Connection) -> None:
+    """Convierte la `activities` simple en la partición histórica de la nueva tabla."""
+    legacy = f"{PARENT}_legacy"
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {legacy}"))
+    # la PK (id) chocaría con la (id, ts) del padre al adjuntarla, y la secuencia
+    # del SERIAL con la que crea la columna identity: se quitan/renombran
+    pkey = conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) AND contype = 'p'"
+    ), {"t": legacy}).scalar()
+    if pkey:
+        conn.execute(text(f'ALTER TABLE {legacy} DROP CONSTRAINT "{pkey}"'))
+    seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": legacy}).scalar()
+    conn.execute(text(f"ALTER TABLE {legacy} ALTER COLUMN id DROP DEFAULT"))
+    if seq:
+        conn.execute(text(f"ALTER SEQUENCE {seq} RENAME TO {legacy}_id_seq"))
+    # índices propios con nombres del padre (ix_activities_*): CREATE INDEX en el
+    # padre los reutiliza como partición del índice si coinciden
+    for (index,) in conn.execute(text(
+        "SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = CAST(:t AS regclass)"
+    ), {"t": legacy}).all():
+        if index.startswith(f"ix_{PARENT}_"):
+            conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index.replace(PARENT, legacy, 1)}"'))
+    conn.execute(text(f"UPDATE {legacy} SET ts = to_timestamp(0) WHERE ts IS NULL"))
+    conn.execute(text(f"ALTER TABLE {legacy} ALTER COLUMN ts SET NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {legacy} ALTER COLUMN id TYPE BIGINT"))  # reescribe la tabla
+    conn.execute(text(_PG_PARENT_DDL))
+    max_id, max_ts = conn.execute(text(f"SELECT max(id), max(ts) FROM {legacy}")).one()
+    upper = next_period(period_start(max_ts)) if max_ts else period_start(datetime.datetime.now(UTC))
+    conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{upper.isoformat()}')"))
+    if max_id:
+        conn.execute(text(f"ALTER TABLE {PARENT} ALTER COLUMN id RESTART WITH {int(max_id) + 1}"))
+
+def _pg_partitions(conn: Connection) -> List[Tuple[str, datetime.datetime | None]]:
+    """(nombre, cota superior) de cada partición; None para la DEFAULT."""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": PARENT}).all()
+    out = []
+    for name, bound in rows:
+        m = re.search(r"TO \('([^']+)'\)", bound or "")
+        out.append((name, datetime.datetime.fromisoformat(m.group(1)) if m else None))
+    return out
+
+def ensure_partitions(conn: Connection, now: datetime.datetime) -> int:
+    """Crea la partición del período actual y ACTIVITY_PARTITIONS_AHEAD siguientes."""
+    existing = dict(_pg_partitions(conn))
+    created = 0
+    if f"{PARENT}_default" not in existing:
+        conn.execute(text(f"CREATE TABLE {PARENT}_default PARTITION OF {PARENT} DEFAULT"))
+    start = period_start(now)
+    legacy_upper = existing.get(f"{PARENT}_legacy")
+    if legacy_upper is not None and start < legacy_upper:
+        start = legacy_upper  # la partición legacy ya cubre hasta ahí
+    for _ in range(settings.ACTIVITY_PARTITIONS_AHEAD + 1):
+        end = next_period(start)
+        name = partition_name(start)
+        if name not in existing:
+            try:
+                with conn.begin_nested():
+                    conn.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF {PARENT} "
+                        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                    ))
+                created += 1
+            except Exception as ex:
+                # p. ej. se solapa con la partición legacy o hay filas en DEFAULT
+                print(f"[WARN] No se pudo crear la partición {name}: {ex}")
+        start = end
+    return created
+
+def _pg_retention(conn: Connection, cutoff: datetime.datetime) -> List[str]:
+    removed = []
+    for name, upper in _pg_partitions(conn):
+        if upper is None or upper > cutoff:
+            continue
+        if settings.ACTIVITY_RETENTION_MODE == "detach":
+            # queda como tabla suelta para pg_dump/archivo; ya no la ven las consultas
+            conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            conn.execute(text(f"ALTER TABLE {name} RENAME TO {name.replace(PARENT, PARENT + '_archive', 1)}"))
+        else:
+            conn.execute(text(f"DROP TABLE {name}"))
+        removed.append(name)
+    return removed
+
+# ---- motores sin particiones
+def _delete_retention(conn: Connection, cutoff: datetime.datetime) -> int:
+    total = 0
+    while True:
+        ids = select(Activity.id).where(Activity.ts < cutoff).limit(_DELETE_CHUNK).scalar_subquery()
+        n = conn.execute(delete(Activity).where(Activity.id.in_(ids))).rowcount
+        total += n or 0
+        if not n or n < _DELETE_CHUNK:
+            return total
+
+def _int4_ids(conn: Connection) -> List[str]:
+    """Tablas de _BIGINT_TABLES cuyo id sigue siendo INTEGER (creadas por una versión anterior)."""
+    return [t for (t,) in conn.execute(text(
+        "SELECT table_name FROM information_schema.columns WHERE table_schema = current_schema() "
+        "AND column_name = 'id' AND data_type = 'integer' AND table_name = ANY(:tables)"
+    ), {"tables": list(_BIGINT_TABLES)}).all()]
+
+# ---- API
+def _create_indexes(conn: Connection, tables) -> None:
+    # create_all no agrega índices a tablas ya existentes
+    for table in tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def _pg_legacy_indexes() -> None:
+    """Índices de Activity sobre una `activities` simple todavía sin migrar.
+
+    Sin ellos la retención y las consultas de la bitácora recorren la tabla
+    entera. CONCURRENTLY no bloquea escrituras, pero no corre dentro de una
+    transacción: conexión en autocommit y advisory lock de sesión. Un índice
+    que quedó INVALID por un intento cortado se borra y se vuelve a crear.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _LOCK_KEY})
+        try:
+            for index in Activity.__table__.indexes:
+                valid = conn.execute(text(
+                    "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                    "WHERE c.relname = :name AND n.nspname = current_schema()"
+                ), {"name": index.name}).scalar()
+                if valid:
+                    continue
+                if valid is not None:
+                    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                cols = ", ".join(f'"{c.name}"' for c in index.columns)
+                print(f"[WARN] Creando índice {index.name} en {PARENT} (tabla simple sin migrar)")
+                conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index.name}" ON {PARENT} ({cols})'))
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_KEY})
+
+def bootstrap() -> None:
+    """Crea tablas e índices faltantes (idempotente, seguro con varios workers)."""
+    # primero todo lo que no es la bitácora de Postgres, en su propia transacción:
+    # un problema con las particiones no deja sin tablas al resto de la app
+    with engine.begin() as conn:
+        pg = _is_pg(conn)
+        if pg:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_KEY})
+        tables = [t for t in Base.metadata.sorted_tables if not (pg and t.name == PARENT)]
+        Base.metadata.create_all(conn, tables=tables)
+        _create_indexes(conn, tables)
+        narrow = _int4_ids(conn) if pg else []
+    if not pg:
+        return
+    if narrow:
+        print(f"[WARN] id INTEGER en {', '.join(narrow)}: se agota en 2^31 filas; "
+              f"correr `python -m services.schema migrate-bigint-ids`")
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_KEY})
+        kind = _relkind(conn, PARENT)
+        legacy = kind is not None and kind != "p"
+        if legacy:
+            print(f"[WARN] {PARENT} es una tabla simple de una versión anterior: sigue en uso sin "
+                  f"particiones hasta correr `python -m services.schema migrate-activities`")
+        elif kind is None:
+            conn.execute(text(_PG_PARENT_DDL))
+        if not legacy:
+            ensure_partitions(conn, datetime.datetime.now(UTC))
+            _create_indexes(conn, [Activity.__table__])
+    if legacy:
+        _pg_legacy_indexes()
+
+def migrate_activities() -> str:
+    """Migración única: convierte una `activities` simple en tabla particionada.
+
+    Reescribe la tabla (id pasa a BIGINT) y la toma con lock exclusivo mientras
+    dura; correrla en una ventana de mantenimiento, no desde el startup.
+    """
+    with engine.begin() as conn:
+        if not _is_pg(conn):
+            return "nada que hacer: la bitácora solo se particiona en Postgres"
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_KEY})
+        kind = _relkind(conn, PARENT)
+        if kind == "p":
+            return f"nada que hacer: {PARENT} ya está particionada"
+        if kind is None:
+            conn.execute(text(_PG_PARENT_DDL))
+        else:
+            _pg_migrate_legacy(conn)
+        ensure_partitions(conn, datetime.datetime.now(UTC))
+        _create_indexes(conn, [Activity.__table__])
+    return f"{PARENT} particionada" + (f"; datos previos en {PARENT}_legacy" if kind else "")
+
+def migrate_bigint_ids() -> str:
+    """Migración única: id (y su secuencia) de INTEGER a BIGINT.
+
+    Reescribe cada tabla con lock exclusivo; correrla en una ventana de
+    mantenimiento, no desde el startup.
+    """
+    with engine.begin() as conn:
+        if not _is_pg(conn):
+            return "nada que hacer: sqlite ya usa ids de 64 bits"
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_KEY})
+        tables = _int4_ids(conn)
+        for table in tables:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN id TYPE BIGINT"))
+            seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table}).scalar()
+            if seq:
+                conn.execute(text(f"ALTER SEQUENCE {seq} AS BIGINT"))
+    return f"id BIGINT en {', '.join(tables)}" if tables else "nada que hacer: los ids ya son BIGINT"
+
+def maintain(now: datetime.datetime | None = None) -> None:
+    now = now or datetime.datetime.now(UTC)
+    cutoff = now - datetime.timedelta(days=settings.ACTIVITY_RETENTION_D)
+    with engine.begin() as conn:
+        if _is_pg(conn) and _relkind(conn, PARENT) == "p":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_KEY})
+            ensure_partitions(conn, now)
+            _pg_retention(conn, cutoff)
+        else:
+            _delete_retention(conn, cutoff)
+
+async def _loop() -> None:
+    while True:
+        await asyncio.sleep(settings.ACTIVITY_MAINTAIN_EVERY_S)
+        if not state.leader:
+            continue
+        try:
+            await asyncio.to_thread(maintain)
+        except Exception as ex:
+            print(f"[WARN] Falló el mantenimiento de la bitácora: {ex}")
+
+async def start() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_loop())
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+if __name__ == "__main__":
+    # uso (desde app/, con la app detenida o en ventana de mantenimiento):
+    #   python -m services.schema migrate-activities
+    #   python -m services.schema migrate-bigint-ids
+    import sys
+    commands = {"migrate-activities": migrate_activities, "migrate-bigint-ids": migrate_bigint_ids}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        sys.exit(f"uso: python -m services.schema {{{'|'.join(commands)}}}")
+    print(commands[sys.argv[1]]())
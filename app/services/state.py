@@ -1,9 +1,21 @@
 import time
-from collections import defaultdict, deque
+from collections import defaultdict
 
-HISTORY_WINDOW = 60  # muestras en memoria (cada /status)
-history = defaultdict(lambda: deque(maxlen=HISTORY_WINDOW))  # name -> deque[{ts, up, lat, err}]
+from config import settings
+from .ring import ProbeRing
+
+HISTORY_WINDOW = settings.HISTORY_WINDOW  # muestras en memoria por equipo (una por sondeo)
+history = defaultdict(lambda: ProbeRing(HISTORY_WINDOW))  # name -> ProbeRing
 last_error = {}  # name -> str
 
+# Última lectura por equipo (la escribe el scheduler, la leen /status y /metrics)
+snapshot = {}  # name -> dict (resultado de _check_one + uptime_pct)
+snapshot_ts = 0.0
+snapshot_version = 0  # se incrementa con cada cambio del snapshot (cachés de /status)
+
+# False en los workers que no ganaron la elección de líder (SHARED_STATE=1):
+# no sondean ni mantienen las tablas de historial, solo leen lo que publica el líder
+leader = True
+
 def now_ts() -> float:
     return time.time()
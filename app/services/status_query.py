@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from . import registry
+from .registry import TeamRegistry
+
+# Filtros, orden y paginación de /status sobre el snapshot en memoria.
+# Los índices de texto (nombre, tag, repo) dependen solo del roster: se arman
+# una vez por registro publicado y se reutilizan hasta la próxima recarga.
+# Estado, latencia y uptime cambian con cada sondeo y se leen del snapshot.
+STATUSES = ("up", "down", "unknown")
+SORTS = ("name", "latency", "uptime", "status")
+_GRAM = 3
+
+def _grams(text: str) -> Set[str]:
+    return {text[i:i + _GRAM] for i in range(len(text) - _GRAM + 1)}
+
+class StatusIndex:
+    """Índices del roster: trigramas sobre nombre/tag/repo y equipos por tag."""
+
+    def __init__(self, reg: TeamRegistry):
+        self.reg = reg
+        self.names: Tuple[str, ...] = tuple(t.name for t in reg)
+        self.pos: Dict[str, int] = {n: i for i, n in enumerate(self.names)}
+        # "\0" separa los campos: ningún trigrama de la búsqueda cruza de uno a otro
+        self.text: Dict[str, str] = {
+            t.name: "\0".join((t.name, t.tag or "", t.repo or "")).lower() for t in reg
+        }
+        grams: Dict[str, Set[str]] = {}
+        for name, text in self.text.items():
+            for g in _grams(text):
+                grams.setdefault(g, set()).add(name)
+        self.grams: Dict[str, FrozenSet[str]] = {g: frozenset(v) for g, v in grams.items()}
+        self.tags: Tuple[str, ...] = tuple(sorted(reg.by_tag))
+        self.by_tag: Dict[str, FrozenSet[str]] = {
+            tag.lower(): frozenset(t.name for t in teams) for tag, teams in reg.by_tag.items()
+        }
+
+    def search(self, q: str) -> Iterable[str]:
+        q = q.lower()
+        if len(q) < _GRAM:  # muy corta para el índice: recorrido de los textos ya en minúsculas
+            return [n for n in self.names if q in self.text[n]]
+        postings = sorted((self.grams.get(g, frozenset()) for g in _grams(q)), key=len)
+        found = set(postings[0]).intersection(*postings[1:])
+        # los trigramas no garantizan contigüidad: se confirma la subcadena
+        return [n for n in found if q in self.text[n]]
+
+_index: StatusIndex | None = None
+
+def index() -> StatusIndex:
+    global _index
+    reg = registry.current()
+    if _index is None or _index.reg is not reg:
+        _index = StatusIndex(reg)
+    return _index
+
+def _status_of(r: Dict[str, Any] | None) -> str:
+    st = (r or {}).get("status")
+    return st if st in ("up", "down") else "unknown"
+
+def _sort_key(field: str, desc: bool, snapshot: Dict[str, Dict[str, Any]], pos: Dict[str, int]):
+    # los equipos sin dato van al final en ambos sentidos; el empate conserva el orden del roster
+    sign = -1 if desc else 1
+    if field in ("latency", "uptime"):
+        attr = "latency_ms" if field == "latency" else "uptime_pct"
+        def key(n):
+            v = (snapshot.get(n) or {}).get(attr)
+            return (v is None, sign * (v or 0), pos[n])
+    else:  # status
+        rank = {s: i for i, s in enumerate(STATUSES)}
+        def key(n):
+            return (sign * rank[_status_of(snapshot.get(n))], pos[n])
+    return key
+
+def select(q: str | None, tags: List[str], statuses: List[str], sort: str | None,
+           snapshot: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Nombres que cumplen los filtros, en el orden pedido (roster si no hay sort)."""
+    idx = index()
+    names: Iterable[str] = idx.names
+    candidates: Set[str] | None = None
+    if q:
+        candidates = set(idx.search(q))
+    if tags:
+        tagged = set().union(*(idx.by_tag.get(t.lower(), frozenset()) for t in tags))
+        candidates = tagged if candidates is None else candidates & tagged
+    if candidates is not None:
+        names = sorted(candidates, key=idx.pos.__getitem__)
+    # el snapshot puede traer equipos de un roster que este worker aún no recargó
+    names = [n for n in names if n in snapshot]
+    if statuses:
+        wanted = set(statuses)
+        names = [n for n in names if _status_of(snapshot[n]) in wanted]
+    if sort:
+        desc = sort.startswith("-")
+        field = sort.lstrip("-")
+        if field == "name":
+            names.sort(key=str.lower, reverse=desc)
+        else:
+            names.sort(key=_sort_key(field, desc, snapshot, idx.pos))
+    return names
+
+# ---- cuerpos ya codificados por consulta; valen mientras no cambie el snapshot.
+# Solo se usan desde el loop de asyncio (/status es async): sin locks
+_MAX_BODIES = 64
+_bodies: "OrderedDict[Tuple[Any, ...], bytes]" = OrderedDict()
+_bodies_version: Any = None
+
+def cached_body(key: Tuple[Any, ...], version: Any) -> bytes | None:
+    global _bodies_version
+    if version != _bodies_version:
+        _bodies.clear()
+        _bodies_version = version
+        return None
+    body = _bodies.get(key)
+    if body is not None:
+        _bodies.move_to_end(key)
+    return body
+
+def store_body(key: Tuple[Any, ...], version: Any, body: bytes) -> None:
+    if version != _bodies_version:
+        return
+    _bodies[key] = body
+    while len(_bodies) > _MAX_BODIES:
+        _bodies.popitem(last=False)
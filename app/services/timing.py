@@ -0,0 +1,131 @@
+import cProfile, contextvars, io, pstats, time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List
+
+from config import settings
+
+# Fases con nombre por request (Server-Timing). El middleware deja un dict en
+# el contextvar; el código instrumentado suma ahí su duración. Fuera de un
+# request (scheduler, writers en segundo plano) phase() no hace nada.
+_phases: contextvars.ContextVar[Dict[str, float] | None] = contextvars.ContextVar("timing_phases", default=None)
+
+def begin() -> Dict[str, float]:
+    phases: Dict[str, float] = {}
+    _phases.set(phases)
+    return phases
+
+def add(name: str, seconds: float) -> None:
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - started)
+
+def header(phases: Dict[str, float], total: float, queries: int = 0) -> str:
+    parts = [f"{name};dur={secs * 1000:.1f}" for name, secs in phases.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    if queries:
+        parts.append(f'queries;desc="{queries}"')
+    return ", ".join(parts)
+
+# ---- requests lentos: se imprimen y se guardan los últimos para /api/admin/slow
+slow_log: Deque[Dict[str, Any]] = deque(maxlen=settings.SLOW_REQUEST_KEEP)
+
+def note_slow(method: str, path: str, status: int, phases: Dict[str, float], total: float,
+              queries: int = 0) -> None:
+    entry = {
+        "ts": time.time(),
+        "method": method,
+        "path": path,
+        "status": status,
+        "total_ms": round(total * 1000, 1),
+        "phases_ms": {k: round(v * 1000, 1) for k, v in phases.items()},
+        "queries": queries,
+    }
+    slow_log.append(entry)
+    detail = " ".join(f"{k}={v}ms" for k, v in entry["phases_ms"].items()) or "-"
+    if queries:
+        detail += f" queries={queries}"
+    print(f"[WARN] Request lento {method} {path} -> {status} en {entry['total_ms']}ms ({detail})")
+
+# ---- profiling bajo demanda (cProfile) de los próximos N requests a una ruta.
+# cProfile mide todo el hilo: con requests concurrentes el reporte incluye lo que
+# corrió en el loop mientras tanto, por eso se activa solo mientras hay alguno
+# de la ruta en curso. Solo rutas async: un endpoint `def` corre en el threadpool
+# y su trabajo no aparece en el perfil del loop (admin.start_profile las rechaza).
+class _Session:
+    def __init__(self, path: str, requests: int):
+        self.path = path
+        self.wanted = requests
+        self.started = 0
+        self.done = 0
+        self.active = 0
+        self.profile = cProfile.Profile()
+        self.created = time.time()
+        self.report: str | None = None
+
+_session: _Session | None = None
+
+def arm(path: str, requests: int) -> Dict[str, Any]:
+    global _session
+    if _session is not None and _session.active:
+        _session.profile.disable()
+    _session = _Session(path, requests)
+    return status()
+
+def cancel() -> None:
+    global _session
+    if _session is not None and _session.active:
+        _session.profile.disable()
+    _session = None
+
+def wants(path: str) -> bool:
+    s = _session
+    return s is not None and s.report is None and s.path == path and s.started < s.wanted
+
+def enter() -> None:
+    s = _session
+    s.started += 1
+    if s.active == 0:
+        s.profile.enable()
+    s.active += 1
+
+def leave(s: "_Session | None" = None) -> None:
+    s = s or _session
+    if s is None:
+        return
+    s.active -= 1
+    s.done += 1
+    if s.active == 0:
+        s.profile.disable()
+    if s.done >= s.wanted and s.active == 0:
+        out = io.StringIO()
+        pstats.Stats(s.profile, stream=out).sort_stats("cumulative").print_stats(settings.PROFILE_TOP)
+        s.report = out.getvalue()
+
+def current() -> "_Session | None":
+    return _session
+
+def status() -> Dict[str, Any]:
+    s = _session
+    if s is None:
+        return {"armed": False}
+    return {
+        "armed": s.report is None,
+        "scope": "hilo del event loop (solo rutas async)",
+        "path": s.path,
+        "requests": s.wanted,
+        "done": s.done,
+        "created": s.created,
+        "report": s.report,
+    }
+
+def recent_slow() -> List[Dict[str, Any]]:
+    return list(slow_log)
@@ -0,0 +1,84 @@
+"""Servicios de equipo falsos para benchmarks.
+
+Levanta N servidores HTTP mínimos en localhost que responden ``GET /health``
+como lo haría el contenedor de un equipo. El monitor sondea
+``http://{name}:8000/health``, así que cada equipo usa su propia IP de
+loopback (127.1.x.y, Linux enruta todo 127/8) y el nombre del equipo es esa IP.
+
+Uso::
+
+    python benchmarks/fake_teams.py --teams 100 --latency-ms 20 --error-rate 0.05 --hang-rate 0.01
+"""
+import argparse, asyncio, json, random, sys
+
+PORT = 8000
+
+def team_ip(i: int) -> str:
+    return f"127.1.{i // 254}.{i % 254 + 1}"
+
+def dead_ip(i: int) -> str:
+    # 127.2/16: nadie escucha ahí, el connect recibe RST (contenedor apagado)
+    return f"127.2.{i // 254}.{i % 254 + 1}"
+
+def teams_json(n: int, dead: int = 0) -> str:
+    teams = [{"name": team_ip(i), "port": 10000 + i} for i in range(n)]
+    teams += [{"name": dead_ip(i), "port": 20000 + i} for i in range(dead)]
+    return json.dumps(teams)
+
+class Behaviour:
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float, hang_rate: float, seed: int):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.rng = random.Random(seed)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:  # keep-alive: varias requests por conexión
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head:
+                    break
+                delay = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+                roll = self.rng.random()
+                if roll < self.hang_rate:
+                    await asyncio.sleep(3600)  # el cliente cortará por timeout
+                await asyncio.sleep(delay)
+                if roll < self.hang_rate + self.error_rate:
+                    status, body = "500 Internal Server Error", b'{"status":"error"}'
+                else:
+                    status, body = "200 OK", b'{"status":"ok"}'
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(n: int, behaviour: Behaviour) -> None:
+    servers = []
+    for i in range(n):
+        servers.append(await asyncio.start_server(behaviour.handle, team_ip(i), PORT, backlog=512))
+    print(f"READY {n}", flush=True)
+    await asyncio.gather(*(s.serve_forever() for s in servers))
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--teams", type=int, default=10)
+    ap.add_argument("--latency-ms", type=float, default=5)
+    ap.add_argument("--jitter-ms", type=float, default=2)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--hang-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+    behaviour = Behaviour(args.latency_ms, args.jitter_ms, args.error_rate, args.hang_rate, args.seed)
+    try:
+        asyncio.run(serve(args.teams, behaviour))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
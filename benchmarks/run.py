@@ -0,0 +1,339 @@
+"""Benchmarks de carga de principal-isi contra equipos falsos locales.
+
+Escenarios:
+
+* ``probe``: una ronda de ``monitor.check_all`` sobre N equipos (en proceso).
+* ``status``, ``metrics``, ``teams``: clientes concurrentes contra la app real
+  (uvicorn en un subproceso). ``teams`` pasa por el middleware de bitácora.
+* ``login``: clientes concurrentes haciendo ``POST /api/login``.
+* ``history``: clientes concurrentes pidiendo ``GET /history`` (ventana en memoria).
+* ``encode``: costo de serializar ``/status`` y ``/history`` en proceso, json de la
+  stdlib contra el camino orjson + fragmentos cacheados.
+
+Reporta throughput, p50/p99 y memoria (RSS del proceso de la app) y compara
+contra ``benchmarks/baseline.json``; ``--save-baseline`` lo reescribe.
+
+Uso::
+
+    python benchmarks/run.py --teams 10,100,1000 --clients 1,50,200 --duration 10
+    python benchmarks/run.py --scenarios probe --teams 500 --hang-rate 0.1
+"""
+import argparse, asyncio, json, os, socket, subprocess, sys, tempfile, time, uuid
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+
+HERE = Path(__file__).resolve().parent
+APP_DIR = HERE.parent / "app"
+BASELINE = HERE / "baseline.json"
+sys.path.insert(0, str(HERE))
+from fake_teams import teams_json  # noqa: E402
+
+def pct(values, q: float) -> float:
+    if not values:
+        return float("nan")
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, round(q * (len(s) - 1))))]
+
+def summarize(latencies, elapsed: float, errors: int, rejected: int = 0) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rejected": rejected,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(pct(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(pct(latencies, 0.99) * 1000, 2),
+    }
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def rss_mb(pid: int) -> float:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return float("nan")
+
+# ---- procesos auxiliares
+class FakeTeams:
+    def __init__(self, n: int, args):
+        self.n = n
+        self.cmd = [sys.executable, str(HERE / "fake_teams.py"), "--teams", str(n),
+                    "--latency-ms", str(args.latency_ms), "--error-rate", str(args.error_rate),
+                    "--hang-rate", str(args.hang_rate)]
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, text=True)
+        line = self.proc.stdout.readline()
+        if not line.startswith("READY"):
+            raise RuntimeError("no arrancaron los equipos falsos")
+        return self
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.wait()
+
+class AppServer:
+    def __init__(self, n_teams: int, args):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        db_url = args.database_url or f"sqlite:///{tempfile.gettempdir()}/principal_bench_{os.getpid()}.db"
+        # todo el escenario login sale de 127.0.0.1: sin esto mide el rate limit por IP,
+        # el cupo de admisión de auth y el tope de la cola de hashing, no el throughput
+        # del login. Se pueden sobreescribir desde el entorno para medir esos límites.
+        limits = {"AUTH_RATE_PER_S": "1000000", "AUTH_RATE_BURST": "1000000", "HASH_QUEUE_MAX": "100000",
+                  "ADMIT_LIMITS": "monitor=256,stream=1000,auth=100000,api=128,pages=128,static=256"}
+        self.env = {**limits, **os.environ, "TEAMS_JSON": teams_json(n_teams, args.dead_teams), "DATABASE_URL": db_url,
+                    "PROBE_INTERVAL_S": str(args.probe_interval), "HISTORY_WINDOW": str(args.history_window)}
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.port), "--log-level", "warning"],
+            cwd=APP_DIR, env=self.env,
+        )
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                if httpx.get(self.url + "/health", timeout=1).is_success:
+                    return self
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        self.proc.terminate()
+        raise RuntimeError("la app no respondió /health")
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.wait()
+
+# ---- generador de carga
+# HTTP/1.1 keep-alive a mano sobre asyncio, una conexión por cliente simulado.
+# httpx cuesta ~1.3ms de CPU por request: con pocos núcleos el generador era el
+# cuello de botella (una app FastAPI vacía no pasaba de ~590 rps con httpx y
+# da ~2900 así) y los clients=50 medían al cliente, no a la app.
+class Conn:
+    def __init__(self, url: str):
+        u = urlsplit(url)
+        self.host, self.port = u.hostname, u.port or 80
+        self.target = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        self.reader = self.writer = None
+
+    async def request(self, method: str, body: bytes | None) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {self.target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept-Encoding: gzip\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        self.writer.write(head.encode() + b"\r\n" + (body or b""))
+        lines = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        code = int(lines[0].split()[1])
+        headers = dict(l.lower().split(": ", 1) for l in lines[1:] if ": " in l)
+        if headers.get("transfer-encoding") == "chunked":
+            while True:
+                n = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await self.reader.readexactly(n + 2)
+                if n == 0:
+                    break
+        else:
+            await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection") == "close":
+            self.close()
+        return code
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+async def drive(url: str, clients: int, duration: float, method: str = "GET", body=None) -> dict:
+    latencies, errors, rejected = [], 0, 0
+    payload = json.dumps(body).encode() if body is not None else None
+    stop_at = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors, rejected
+        conn = Conn(url)
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                code = await conn.request(method, payload)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                conn.close()
+                code = 0
+            if code and code < 400:
+                latencies.append(time.perf_counter() - t0)
+            elif code in (429, 503):  # rechazo por límite (rate limit, cola llena): no es una falla
+                rejected += 1
+            else:
+                errors += 1
+        conn.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, errors, rejected)
+
+# ---- escenarios
+def bench_probe(n_teams: int, args) -> dict:
+    sys.path.insert(0, str(APP_DIR))
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/principal_bench_probe.db")
+    from services import monitor, probe_client
+    from services.registry import TeamRegistry
+
+    reg = TeamRegistry.parse(teams_json(n_teams, args.dead_teams), "localhost")
+
+    async def rounds():
+        times = []
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            for r in await monitor.check_all(reg):
+                monitor.record_result(r)  # alimenta historial, timeouts adaptativos y breaker
+            times.append(time.perf_counter() - t0)
+        await probe_client.close()
+        return times
+
+    import resource
+    times = asyncio.run(rounds())
+    out = summarize(times, sum(times), 0)
+    out["teams_per_s"] = round((n_teams + args.dead_teams) * len(times) / sum(times), 1)
+    out["rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return out
+
+def bench_encode(n_teams: int, args) -> dict:
+    sys.path.insert(0, str(APP_DIR))
+    os.environ.setdefault("HISTORY_WINDOW", str(args.history_window))
+    from services import state, fastjson
+    from services.registry import TeamRegistry
+
+    reg = TeamRegistry.parse(teams_json(n_teams), "localhost")
+    now = time.time()
+    for t in reg:
+        for k in range(state.HISTORY_WINDOW):
+            state.history[t.name].append(now - k, 1, 5 + k % 7, None if k % 11 else "timeout (1.50s)")
+        state.snapshot[t.name] = {**t.meta(), "status": "up", "http": 200, "latency_ms": 5,
+                                  "error": None, "cached": False, "uptime_pct": 99.9}
+    names = list(state.snapshot)
+    ts = int(now)
+
+    def status_std():
+        return json.dumps({"host": "localhost", "results": list(state.snapshot.values()), "ts": ts}).encode()
+
+    def status_fast():
+        # como en producción: entre dos pedidos cambia ~1% de los equipos
+        for name in names[: max(1, n_teams // 100)]:
+            state.snapshot[name] = dict(state.snapshot[name])
+        state.snapshot_version += 1
+        return fastjson.encode_status("localhost", state.snapshot, ts, state.snapshot_version)
+
+    def status_cached():
+        return fastjson.encode_status("localhost", state.snapshot, ts, state.snapshot_version)
+
+    def history_std():
+        return json.dumps({name: list(buf) for name, buf in state.history.items()}).encode()
+
+    def history_fast():
+        return fastjson.dumps({name: list(buf) for name, buf in state.history.items()})
+
+    def history_columnar():
+        return fastjson.dumps({name: buf.columns(buf.window()) for name, buf in state.history.items()})
+
+    out = {}
+    for label, fn in (("status-std", status_std), ("status-fast", status_fast), ("status-cached", status_cached),
+                      ("history-std", history_std), ("history-fast", history_fast), ("history-columnar", history_columnar)):
+        times, size = [], len(fn())
+        deadline = time.perf_counter() + min(args.duration, 2.0)
+        while time.perf_counter() < deadline or len(times) < 5:
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        out[label] = {**summarize(times, sum(times), 0), "bytes": size}
+    return out
+
+def bench_http(scenario: str, server: AppServer, clients: int, args) -> dict:
+    body, method, path = None, "GET", f"/{scenario}"
+    if scenario == "history":
+        path = "/history?limit=60&format=columnar"
+    if scenario == "login":
+        email, password = f"bench-{uuid.uuid4().hex[:8]}@example.com", "bench-pass-123"
+        httpx.post(server.url + "/api/register", json={"email": email, "password": password}, timeout=30)
+        method, path, body = "POST", "/api/login", {"email": email, "password": password}
+    out = asyncio.run(drive(server.url + path, clients, args.duration, method, body))
+    out["rss_mb"] = rss_mb(server.proc.pid)
+    return out
+
+# ---- baseline
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    notes = []
+    for key, cur in results.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        if old.get("rps") and cur["rps"] < old["rps"] * (1 - tolerance):
+            notes.append(f"REGRESIÓN {key}: rps {old['rps']} -> {cur['rps']}")
+        if old.get("p99_ms") and cur["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            notes.append(f"REGRESIÓN {key}: p99 {old['p99_ms']}ms -> {cur['p99_ms']}ms")
+    return notes
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks de principal-isi")
+    ap.add_argument("--scenarios", default="probe,encode,status,history,metrics,teams,login")
+    ap.add_argument("--teams", default="10,100", help="lista de tamaños de roster")
+    ap.add_argument("--clients", default="1,50", help="lista de clientes concurrentes")
+    ap.add_argument("--duration", type=float, default=5.0, help="segundos por escenario HTTP")
+    ap.add_argument("--rounds", type=int, default=5, help="rondas de check_all en 'probe'")
+    ap.add_argument("--latency-ms", type=float, default=5)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--hang-rate", type=float, default=0.0)
+    ap.add_argument("--dead-teams", type=int, default=0, help="equipos extra sin servicio (connect rechazado)")
+    ap.add_argument("--probe-interval", type=float, default=5.0)
+    ap.add_argument("--history-window", type=int, default=720)
+    ap.add_argument("--database-url", default="")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="margen antes de marcar regresión")
+    ap.add_argument("--out", default="", help="guardar resultados en este JSON")
+    ap.add_argument("--save-baseline", action="store_true")
+    args = ap.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    team_sizes = [int(x) for x in args.teams.split(",")]
+    client_counts = [int(x) for x in args.clients.split(",")]
+    results = {}
+
+    for n in team_sizes:
+        with FakeTeams(n, args):
+            if "probe" in scenarios:
+                results[f"probe/teams={n}"] = bench_probe(n, args)
+                print(f"probe/teams={n}: {results[f'probe/teams={n}']}", flush=True)
+            if "encode" in scenarios:
+                for label, res in bench_encode(n, args).items():
+                    results[f"encode/{label}/teams={n}"] = res
+                    print(f"encode/{label}/teams={n}: {res}", flush=True)
+            http = [s for s in scenarios if s not in ("probe", "encode")]
+            if not http:
+                continue
+            with AppServer(n, args) as server:
+                time.sleep(min(args.probe_interval, 5))  # primera ronda de sondeos
+                for scenario in http:
+                    for c in client_counts:
+                        key = f"{scenario}/teams={n}/clients={c}"
+                        results[key] = bench_http(scenario, server, c, args)
+                        print(f"{key}: {results[key]}", flush=True)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2, sort_keys=True))
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    notes = compare(results, baseline, args.tolerance)
+    for n in notes:
+        print(n)
+    if args.save_baseline:
+        baseline.update(results)
+        BASELINE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"baseline guardado en {BASELINE}")
+    return 1 if notes else 0
+
+if __name__ == "__main__":
+    sys.exit(main())